@@ -6,13 +6,45 @@
 # as in standard chess, excluding castling, en passant, and pawn promotion. The locations on the board are specified
 # using "algebraic notation", with columns labeled a-h and rows labeled 1-8. The program includes a class named ChessVar
 # for playing the game. This class includes an initialization method, a method to get the game state ('UNFINISHED',
-# 'WHITE_WON', or 'BLACK_WON'), and a method to make moves. Players take turns, and the game ends when one player
-# captures all pieces of a specific type. Additionally, the program defines classes for chess pieces (Pawn, Rook,
-# Knight, Bishop, King, and Queen), which are all children of the parent class Pieces. Each piece class has a move
-# method to handle legal moves. The program also defines classes for players (White and Black), which are children of
-# the parent class Player. The Player classes keep track of captured pieces. Finally, the program defines a GameBoard
-# class, which initializes the game board to be set up as in traditional chess, then keeps track of where the pieces are
-# on the board as the game continues.
+# 'WHITE_WON', 'BLACK_WON', or 'DRAW' when optional adjudication is turned on), and a method to make moves. Players take
+# turns, and the game ends when one player captures all pieces of a specific type. Additionally, the program defines
+# classes for chess pieces (Pawn, Rook, Knight, Bishop, King, and Queen), which are all children of the parent class
+# Pieces. Each piece class has a move method to handle legal moves. The program also defines classes for players (White
+# and Black), which are children of the parent class Player. The Player classes keep track of captured pieces. Finally,
+# the program defines a GameBoard class, which initializes the game board to be set up as in traditional chess, then
+# keeps track of where the pieces are on the board as the game continues.
+
+import random
+import threading
+from array import array
+from collections import OrderedDict
+
+# The types of chess pieces, in the order used for integer piece codes. A square's code is 0 if it is empty, 1-6 for a
+# WHITE piece (Pawn through Queen, in this order), and 7-12 for a BLACK piece of the same types.
+PIECE_TYPES = ["Pawn", "Rook", "Knight", "Bishop", "King", "Queen"]
+
+# The letter for each piece type (in PIECE_TYPES order) in position strings; upper case for WHITE, lower case for BLACK.
+PIECE_LETTERS = ["P", "R", "N", "B", "K", "Q"]
+
+# Random 64-bit numbers used to hash positions (Zobrist hashing): one for each square code on each of the 64 squares,
+# and one that is mixed in when it is BLACK's turn. A fixed seed keeps hashes the same in every process and every run.
+_zobrist_random = random.Random(20231210)
+ZOBRIST_SQUARE_KEYS = [[0] * 64] + [[_zobrist_random.getrandbits(64) for _ in range(64)] for _ in range(12)]
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+
+
+def square_to_index(square):
+    """
+    Returns the index (0-63) of a square given in algebraic notation, in the order a1, b1, ... h1, a2, ... h8 (the
+    order used by GameBoard's get_square_codes).
+    """
+    return (int(square[1]) - 1) * 8 + "abcdefgh".index(square[0])
+
+
+def index_to_square(index):
+    """Returns the square in algebraic notation for an index (0-63) from square_to_index."""
+    return "abcdefgh"[index % 8] + str(index // 8 + 1)
+
 
 class Pieces:
     """
@@ -33,11 +65,77 @@ class Pieces:
         either "WHITE" or "BLACK".
         """
         self._player_it_belongs_to = player    # in the future, this could also take a Player object, not just a string
+        self._type_index = PIECE_TYPES.index(self.get_piece_type())     # worked out once, used for codes and counters
 
     def get_player_it_belongs_to(self):
         """Returns the player the Piece belongs to"""
         player = self._player_it_belongs_to  # Either "WHITE" or "BLACK"
         return player
+
+    def get_type_index(self):
+        """Returns the index of this piece's type in PIECE_TYPES (0 for "Pawn" up to 5 for "Queen")."""
+        return self._type_index
+
+    def get_piece_code(self):
+        """
+        Returns the integer code for this piece: 1-6 for a "WHITE" piece and 7-12 for a "BLACK" piece, following the
+        order of PIECE_TYPES. Used wherever the board is stored as numbers instead of Pieces objects.
+        """
+        code = self._type_index + 1
+        if self._player_it_belongs_to == "BLACK":
+            code += len(PIECE_TYPES)
+        return code
+
+    def _get_squares_along_rays(self, from_square, directions, squares):
+        """
+        Walks outward from from_square along each given direction until the edge of the board or the first occupied
+        square (which is included, since it may hold a piece to capture). Used by the sliding pieces (Rook, Bishop,
+        and Queen) to list every square they could move to without re-checking the path for each target.
+
+        Takes three parameters:
+        -from_square (str): represents the square the piece is moving from
+        -directions: a list of (change in column, change in row) pairs
+        -squares: a dictionary of every square on the board and the Piece object (or None) located there
+
+        Returns a list of the squares that can be reached.
+        """
+        column_list = ["a", "b", "c", "d", "e", "f", "g", "h"]
+        current_column_as_int = column_list.index(from_square[0])
+        current_row = int(from_square[1])
+
+        reachable = []
+        for change_in_column, change_in_row in directions:
+            column = current_column_as_int + change_in_column
+            row = current_row + change_in_row
+            while 0 <= column < 8 and 1 <= row <= 8:
+                on_route = column_list[column] + str(row)
+                reachable.append(on_route)
+                if squares[on_route] is not None:
+                    break   # the path is blocked beyond this square
+                column += change_in_column
+                row += change_in_row
+
+        return reachable
+
+    def _get_squares_by_offsets(self, from_square, offsets):
+        """
+        Lists the on-board squares that are a fixed (change in column, change in row) offset away from from_square.
+        Used by the Knight and King, whose moves do not depend on the squares in between.
+
+        Returns a list of the squares that can be reached.
+        """
+        column_list = ["a", "b", "c", "d", "e", "f", "g", "h"]
+        current_column_as_int = column_list.index(from_square[0])
+        current_row = int(from_square[1])
+
+        reachable = []
+        for change_in_column, change_in_row in offsets:
+            column = current_column_as_int + change_in_column
+            row = current_row + change_in_row
+            if 0 <= column < 8 and 1 <= row <= 8:
+                reachable.append(column_list[column] + str(row))
+
+        return reachable
     
 
 class Pawn(Pieces):
@@ -62,6 +160,14 @@ class Pawn(Pieces):
         """
         return "Pawn"
 
+    def is_first_move(self):
+        """Returns True if this Pawn has not moved yet (so it may still move forward two squares)."""
+        return self._first_move
+
+    def set_first_move(self, first_move):
+        """Sets whether this Pawn has not moved yet. Used by ChessVar's undo_move to give back a pawn's first move."""
+        self._first_move = first_move
+
     def move(self, from_square, to_square, game_board):
         """
         Represents the legal moves that a Pawn can make.
@@ -186,6 +292,52 @@ class Pawn(Pieces):
 
                 return False
 
+    def get_possible_moves(self, from_square, squares):
+        """
+        Lists every square this Pawn could legally move to from from_square, following the same rules as the move
+        method. Unlike move, this does not use up the pawn's first move, so it can be used to check moves without
+        making them.
+
+        Takes two parameters:
+        -from_square (str): represents the square the piece is moving from
+        -squares: a dictionary of every square on the board and the Piece object (or None) located there
+
+        Returns a list of squares. Squares holding a piece of the same color are included; ChessVar filters those out.
+        """
+        column_list = ["a", "b", "c", "d", "e", "f", "g", "h"]
+        current_column_as_int = column_list.index(from_square[0])
+        current_row = int(from_square[1])
+
+        if self.get_player_it_belongs_to() == "WHITE":
+            forward = 1
+            capture_columns = [current_column_as_int - 1, current_column_as_int + 1]
+        else:
+            forward = -1
+            # A BLACK pawn only captures toward the a-file from column c or higher (matching the move method).
+            capture_columns = [current_column_as_int + 1]
+            if current_column_as_int > 1:
+                capture_columns.append(current_column_as_int - 1)
+
+        possible_moves = []
+        one_ahead_row = current_row + forward
+        if 1 <= one_ahead_row <= 8:
+            one_ahead = from_square[0] + str(one_ahead_row)
+            if squares[one_ahead] is None:
+                possible_moves.append(one_ahead)
+                two_ahead_row = current_row + 2 * forward
+                if self._first_move is True and 1 <= two_ahead_row <= 8:
+                    two_ahead = from_square[0] + str(two_ahead_row)
+                    if squares[two_ahead] is None:
+                        possible_moves.append(two_ahead)
+
+            for column in capture_columns:
+                if 0 <= column < 8:
+                    diagonal = column_list[column] + str(one_ahead_row)
+                    if squares[diagonal] is not None:
+                        possible_moves.append(diagonal)
+
+        return possible_moves
+
 
 class Rook(Pieces):
     """
@@ -274,6 +426,20 @@ class Rook(Pieces):
 
         return False
 
+    def get_possible_moves(self, from_square, squares):
+        """
+        Lists every square this Rook could legally move to from from_square (straight lines up to and including the
+        first occupied square in each direction).
+
+        Takes two parameters:
+        -from_square (str): represents the square the piece is moving from
+        -squares: a dictionary of every square on the board and the Piece object (or None) located there
+
+        Returns a list of squares. Squares holding a piece of the same color are included; ChessVar filters those out.
+        """
+        straight_lines = [(0, 1), (0, -1), (1, 0), (-1, 0)]
+        return self._get_squares_along_rays(from_square, straight_lines, squares)
+
 
 class Knight(Pieces):
     """
@@ -368,6 +534,19 @@ class Knight(Pieces):
 
         return False
 
+    def get_possible_moves(self, from_square, squares):
+        """
+        Lists every square this Knight could legally move to from from_square.
+
+        Takes two parameters:
+        -from_square (str): represents the square the piece is moving from
+        -squares: a dictionary of every square on the board and the Piece object (or None) located there
+
+        Returns a list of squares. Squares holding a piece of the same color are included; ChessVar filters those out.
+        """
+        knight_jumps = [(-1, 2), (-1, -2), (1, 2), (1, -2), (-2, 1), (-2, -1), (2, 1), (2, -1)]
+        return self._get_squares_by_offsets(from_square, knight_jumps)
+
 
 class Bishop(Pieces):
     """
@@ -456,6 +635,20 @@ class Bishop(Pieces):
 
         return False
 
+    def get_possible_moves(self, from_square, squares):
+        """
+        Lists every square this Bishop could legally move to from from_square (diagonals up to and including the
+        first occupied square in each direction).
+
+        Takes two parameters:
+        -from_square (str): represents the square the piece is moving from
+        -squares: a dictionary of every square on the board and the Piece object (or None) located there
+
+        Returns a list of squares. Squares holding a piece of the same color are included; ChessVar filters those out.
+        """
+        diagonals = [(1, 1), (-1, 1), (1, -1), (-1, -1)]
+        return self._get_squares_along_rays(from_square, diagonals, squares)
+
 
 class King(Pieces):
     """
@@ -546,6 +739,24 @@ class King(Pieces):
 
         return False
 
+    def get_possible_moves(self, from_square, squares):
+        """
+        Lists every square this King could legally move to from from_square.
+
+        As in the move method, the King only steps toward the a-file when it starts on column c or higher.
+
+        Takes two parameters:
+        -from_square (str): represents the square the piece is moving from
+        -squares: a dictionary of every square on the board and the Piece object (or None) located there
+
+        Returns a list of squares. Squares holding a piece of the same color are included; ChessVar filters those out.
+        """
+        column_list = ["a", "b", "c", "d", "e", "f", "g", "h"]
+        steps = [(0, 1), (0, -1), (1, 0), (1, 1), (1, -1)]
+        if column_list.index(from_square[0]) > 1:
+            steps += [(-1, 0), (-1, 1), (-1, -1)]
+        return self._get_squares_by_offsets(from_square, steps)
+
 
 class Queen(Pieces):
     """
@@ -677,6 +888,20 @@ class Queen(Pieces):
 
         return False
 
+    def get_possible_moves(self, from_square, squares):
+        """
+        Lists every square this Queen could legally move to from from_square (straight lines and diagonals up to and
+        including the first occupied square in each direction).
+
+        Takes two parameters:
+        -from_square (str): represents the square the piece is moving from
+        -squares: a dictionary of every square on the board and the Piece object (or None) located there
+
+        Returns a list of squares. Squares holding a piece of the same color are included; ChessVar filters those out.
+        """
+        all_directions = [(1, 1), (-1, 1), (1, -1), (-1, -1), (0, 1), (0, -1), (1, 0), (-1, 0)]
+        return self._get_squares_along_rays(from_square, all_directions, squares)
+
 
 class Player:
     """
@@ -688,92 +913,119 @@ class Player:
     get the piece type. It will also communicate with ChessVar to update the game state.
     """
 
-    def __init__(self):
+    def __init__(self, won_state):
         """
         Creates a player in the game. This player is initialized to have captured none of its opponent's pieces.
 
-        One private data member:
-        -captured_pieces: A dictionary to keep track of captured pieces by a specific player. The keys of the
-        dictionary are strings of the names of the possible chess pieces ("Pawn", "Rook", "Knight", "Bishop:, "King",
-        "Queen") and the corresponding values are the number of a specific piece that the player's opponent still has
-        left on the board. The values on the dictionary are initialized to the standard number of each type of piece.
+        Parameter:
+        -won_state (str): the game state when this player wins, either "WHITE_WON" or "BLACK_WON"
 
-        """
-        self._pieces_left_to_capture = {
-            "Pawn": 8,  # 8 total pawns per player
-            "Rook": 2,  # 2 total rooks per player
-            "Knight": 2,  # 2 total knights per player
-            "Bishop": 2,  # 2 total bishops per player
-            "King": 1,  # 1 king per player
-            "Queen": 1  # 1 queen per player
-        }
+        Private data members:
+        -pieces_left_to_capture: An array of small integers with one counter for each piece type, in PIECE_TYPES order
+        ("Pawn", "Rook", "Knight", "Bishop", "King", "Queen"), holding the number of that type the player's opponent
+        still has left on the board. The counters are initialized to the standard number of each type of piece.
+        -types_at_zero: A bitmask with bit i set while the counter for PIECE_TYPES[i] is 0, so a win is found without
+        looking through the counters.
+        -won_state: The won_state given.
 
-        # In the future, I would like to initialize all the values to 0 and keep track of pieces captured (rather than
-        # pieces left).
+        """
+        self._pieces_left_to_capture = array("B", [
+            8,  # 8 total pawns per player
+            2,  # 2 total rooks per player
+            2,  # 2 total knights per player
+            2,  # 2 total bishops per player
+            1,  # 1 king per player
+            1   # 1 queen per player
+        ])
+        self._types_at_zero = 0
+        self._won_state = won_state
 
     def get_pieces_left_to_capture(self):
-        """Returns the dictionary with the number of pieces of each type that are left on the board for an opponent."""
-        return self._pieces_left_to_capture
+        """
+        Returns a new dictionary with the number of pieces of each type (keyed by the names in PIECE_TYPES) that are
+        left on the board for an opponent.
+        """
+        return dict(zip(PIECE_TYPES, self._pieces_left_to_capture))
 
-    def update_pieces_left_to_capture(self, captured_piece):
+    def get_captures_needed(self):
+        """
+        Returns a tuple of how many more captures of each piece type (in PIECE_TYPES order) this Player needs to win by
+        capturing that type. The Player wins when any of them reaches 0.
+        """
+        return tuple(self._pieces_left_to_capture)
+
+    def get_types_at_zero(self):
+        """Returns the bitmask of piece types (bit i for PIECE_TYPES[i]) this Player has captured every piece of."""
+        return self._types_at_zero
+
+    def set_pieces_left_to_capture(self, pieces_left):
         """
-        Updates how many pieces of each type a Player's opponent has left on the board (by updating the value for
-        the key that matches the type of piece that was captured) in the pieces_left_to_capture dictionary.
+        Sets how many pieces of each type the Player's opponent has left on the board (used when a game is set up from
+        a position instead of the starting position).
 
-        Communicates with Pieces classes to get the piece type of the Pieces object.
+        Parameter:
+        -pieces_left: a dictionary with a number for each piece type in PIECE_TYPES
         """
-        type_of_piece = captured_piece.get_piece_type()
-        self._pieces_left_to_capture[type_of_piece] -= 1
+        self._types_at_zero = 0
+        for type_index, type_of_piece in enumerate(PIECE_TYPES):
+            self._pieces_left_to_capture[type_index] = pieces_left[type_of_piece]
+            if pieces_left[type_of_piece] == 0:
+                self._types_at_zero |= 1 << type_index
 
+    def update_pieces_left_to_capture(self, captured_piece):
+        """
+        Updates how many pieces of each type a Player's opponent has left on the board (by counting down the counter
+        for the type of piece that was captured), marking the type in types_at_zero when none are left.
 
-class White(Player):
-    """Represents the "WHITE" player in the chess game"""
+        Communicates with Pieces classes to get the type index of the Pieces object.
+        """
+        type_index = captured_piece.get_type_index()
+        pieces_left = self._pieces_left_to_capture[type_index] - 1
+        self._pieces_left_to_capture[type_index] = pieces_left
+        if pieces_left == 0:
+            self._types_at_zero |= 1 << type_index
 
-    def __init__(self):
-        """Creates a "WHITE" player in the game"""
-        super().__init__()  # calls parent class (Player) __init__ method (not necessary)
+    def restore_pieces_left_to_capture(self, captured_piece):
+        """
+        Reverses update_pieces_left_to_capture for a piece that is being put back on the board (when a move is
+        undone), by adding one back to the counter for its piece type.
+        """
+        type_index = captured_piece.get_type_index()
+        self._pieces_left_to_capture[type_index] += 1
+        self._types_at_zero &= ~(1 << type_index)
 
     def check_for_win(self):
         """
-        Checks if the Player has captured all of a specific type of piece (by checking if there are 0 left of any one
-        piece). If the Player has captures all of one type of piece, then that Player has won the game.
+        Checks if the Player has captured all of a specific type of piece (by checking if any type has 0 left, which is
+        a single test of the types_at_zero bitmask). If the Player has captured all of one type of piece, then that
+        Player has won the game.
 
         Communicates with the ChessVar class (specifically the make_move method) after a capture to check the status
         of the game.
 
         Returns "UNFINISHED" if the player has not won the game and the game should continue.
-        Returns "WHITE_WON" if the player has won the game and the game should end.
+        Returns "WHITE_WON" or "BLACK_WON" (the Player's won_state) if the player has won the game and the game should
+        end.
         """
-        for item in self._pieces_left_to_capture:
-            if self._pieces_left_to_capture[item] == 0:
-                return "WHITE_WON"
-        else:
-            return "UNFINISHED"
+        if self._types_at_zero != 0:
+            return self._won_state
+        return "UNFINISHED"
 
 
-class Black(Player):
-    """Represents the "BLACK" player in the chess game"""
+class White(Player):
+    """Represents the "WHITE" player in the chess game"""
 
     def __init__(self):
-        """Creates a "BLACK" player in the game"""
-        super().__init__()  # calls parent class (Player) __init__ method
+        """Creates a "WHITE" player in the game"""
+        super().__init__("WHITE_WON")  # calls parent class (Player) __init__ method
 
-    def check_for_win(self):
-        """
-        Checks if the Player has captured all of a specific type of piece (by checking if there are 0 left of any one
-        piece). If the Player has captures all of one type of piece, then that Player has won the game.
 
-        Communicates with the ChessVar class (specifically the make_move method) after a capture to check the status
-        of the game.
+class Black(Player):
+    """Represents the "BLACK" player in the chess game"""
 
-        Returns "UNFINISHED" if the player has not won the game and the game should continue.
-        Returns "BLACK_WON" if the player has won the game and the game should end.
-        """
-        for item in self._pieces_left_to_capture:
-            if self._pieces_left_to_capture[item] == 0:
-                return "BLACK_WON"
-        else:
-            return "UNFINISHED"
+    def __init__(self):
+        """Creates a "BLACK" player in the game"""
+        super().__init__("BLACK_WON")  # calls parent class (Player) __init__ method
 
 
 class GameBoard:
@@ -847,6 +1099,45 @@ class GameBoard:
                 current_piece = item[square]
                 return current_piece
 
+    def get_squares(self):
+        """
+        Returns a single dictionary of every square on the game board, where the keys are strings of the algebraic
+        location and the values are the Piece object (or None) located there.
+
+        This is a new dictionary each time it is called, so it can be used to look up many squares at once without
+        searching through the eight rows for every lookup (as get_status_of_square does).
+        """
+        squares = {}
+        for item in self._game_board:   # "item" is a dictionary in the list
+            squares.update(item)
+        return squares
+
+    def get_square_codes(self):
+        """
+        Returns the game board as a list of 64 integer piece codes (see PIECE_TYPES), ordered a1, b1, ... h1, a2, ...
+        h8, so that the square in column c (0-7) and row r (1-8) is at index (r - 1) * 8 + c. Empty squares are 0.
+        """
+        square_codes = []
+        for item in self._game_board:
+            for piece in item.values():
+                if piece is None:
+                    square_codes.append(0)
+                else:
+                    square_codes.append(piece.get_piece_code())
+        return square_codes
+
+    def get_position_hash(self, whose_turn_it_is="WHITE"):
+        """
+        Computes the Zobrist hash of the pieces on the game board from scratch, for the given player to move. ChessVar
+        uses this once at the start of a game and then updates the hash with each move.
+        """
+        position_hash = 0
+        for index, code in enumerate(self.get_square_codes()):
+            position_hash ^= ZOBRIST_SQUARE_KEYS[code][index]
+        if whose_turn_it_is == "BLACK":
+            position_hash ^= ZOBRIST_BLACK_TO_MOVE
+        return position_hash
+
     def update_game_board(self, square, piece):
         """
         Updates the game board by making sure pieces are moved and/or removed as directed by the make_move method in
@@ -881,6 +1172,162 @@ class GameBoard:
             return False
 
 
+class MoveCache:
+    """
+    A bounded cache of legal-move lists, keyed by position hash, that can be shared by many ChessVar objects in one
+    process (for example every game on a server, so that reconnects, spectators and repeated analysis of the same
+    position reuse earlier work).
+
+    When the cache holds max_entries positions, adding another removes the least recently used one. A lock makes it
+    safe to use from several threads at once. Copying a ChessVar with copy.deepcopy shares its MoveCache; pickling one
+    (for example to send it to another process) gives an empty MoveCache with the same size limit.
+    """
+
+    def __init__(self, max_entries=100000):
+        """
+        Creates an empty cache.
+
+        Private data members:
+        -max_entries (int): the most positions kept
+        -entries: an OrderedDict from (position hash, player) to (tuple of legal moves, frozenset of the same moves),
+        with the most recently used position last
+        -hits, misses (int): how many lookups found, or did not find, their position
+        -lock: a threading.Lock held while the cache is read or changed
+        """
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def __deepcopy__(self, memo):
+        """Returns this same cache, so that copies of a game keep sharing it."""
+        return self
+
+    def __getstate__(self):
+        """Returns the state to pickle: only the size limit (the entries and lock are not sent)."""
+        return {"max_entries": self._max_entries}
+
+    def __setstate__(self, state):
+        """Restores a pickled cache as an empty cache with the same size limit."""
+        self.__init__(state["max_entries"])
+
+    def get(self, key):
+        """
+        Returns the cached (tuple of legal moves, frozenset of legal moves) for key, or None if it is not cached.
+        Counts a hit or a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry
+
+    def put(self, key, legal_moves):
+        """Stores the legal moves (a list of (from_square, to_square) pairs) for key, evicting the oldest if full."""
+        entry = (tuple(legal_moves), frozenset(legal_moves))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def get_hits(self):
+        """Returns how many lookups found their position in the cache."""
+        return self._hits
+
+    def get_misses(self):
+        """Returns how many lookups did not find their position in the cache."""
+        return self._misses
+
+    def get_size(self):
+        """Returns how many positions are cached."""
+        return len(self._entries)
+
+    def clear(self):
+        """Removes every cached position and resets the hit and miss counts."""
+        with self._lock:
+            self._entries.clear()
+            self._hits = 0
+            self._misses = 0
+
+
+class BoardSnapshot:
+    """
+    An immutable view of a ChessVar game at one moment: the square codes, whose turn it is, the game state, and the
+    position hash. Snapshots are handed out by ChessVar's get_snapshot. Because a snapshot never changes, any number
+    of reader threads (or async tasks) can read it, and keep it, without locks or copies while the game goes on.
+
+    Each snapshot has a version number that goes up by one with every change to the game (a move, an undo, or a new
+    position), and the move number of the game when it was taken (which goes down after an undo).
+    """
+
+    __slots__ = ["_version", "_move_number", "_square_codes", "_whose_turn_it_is", "_game_state", "_position_hash"]
+
+    def __init__(self, version, move_number, square_codes, whose_turn_it_is, game_state, position_hash):
+        """
+        Creates a snapshot.
+
+        Takes six parameters:
+        -version (int): the number of changes made to the game before this snapshot
+        -move_number (int): the number of moves made in the game
+        -square_codes (bytes): the 64 square codes (see GameBoard's get_square_codes)
+        -whose_turn_it_is (str): "WHITE" or "BLACK"
+        -game_state (str): the game state
+        -position_hash (int): the Zobrist hash of the position
+        """
+        self._version = version
+        self._move_number = move_number
+        self._square_codes = square_codes
+        self._whose_turn_it_is = whose_turn_it_is
+        self._game_state = game_state
+        self._position_hash = position_hash
+
+    def get_version(self):
+        """Returns the version number of this snapshot."""
+        return self._version
+
+    def get_move_number(self):
+        """Returns how many moves had been made in the game when this snapshot was taken."""
+        return self._move_number
+
+    def get_square_codes(self):
+        """Returns the 64 square codes as bytes, ordered a1, b1, ... h8 (see GameBoard's get_square_codes)."""
+        return self._square_codes
+
+    def get_square_code(self, square):
+        """Returns the code of the piece on a square given in algebraic notation (0 if the square is empty)."""
+        return self._square_codes[square_to_index(square)]
+
+    def get_whose_turn_it_is(self):
+        """Returns whose turn it was (either 'WHITE' or 'BLACK')."""
+        return self._whose_turn_it_is
+
+    def get_game_state(self):
+        """Returns the game state: 'UNFINISHED', 'WHITE_WON', 'BLACK_WON', or 'DRAW'."""
+        return self._game_state
+
+    def get_position_hash(self):
+        """Returns the position hash (see ChessVar's get_position_hash)."""
+        return self._position_hash
+
+    def get_changes_since(self, older_snapshot):
+        """
+        Returns the squares that differ between an older snapshot of the same game and this one, as a list of
+        (square, square code in this snapshot) pairs in board order, so a client holding older_snapshot's board only
+        needs to be sent these squares (with this snapshot's turn and game state).
+        """
+        old_codes = older_snapshot.get_square_codes()
+        if old_codes == self._square_codes:
+            return []
+        return [(index_to_square(index), code) for index, code in enumerate(self._square_codes)
+                if code != old_codes[index]]
+
+
 class ChessVar:
     """
     Represents an abstract board game that is a variant of chess.
@@ -899,17 +1346,28 @@ class ChessVar:
     will also inform the game state.
     """
 
-    def __init__(self):
+    def __init__(self, move_cache=None, repetition_limit=None, no_capture_limit=None):
         """
-        Initializes a game of a chess variant. Takes no parameters.
+        Initializes a game of a chess variant.
+
+        Takes three optional parameters:
+        -move_cache: a MoveCache (which may be shared with other ChessVar objects) used by get_legal_moves and
+        validate_moves to reuse the legal moves of positions seen before. No caching is done if it is None.
+        -repetition_limit (int): if given, the game is adjudicated a 'DRAW' when a move makes the same position (the
+        same pieces on the same squares with the same player to move) occur this many times, for example 3 for
+        threefold repetition. Positions before the most recent capture cannot occur again, so only those since then
+        are checked.
+        -no_capture_limit (int): if given, the game is adjudicated a 'DRAW' when this many moves in a row (counting
+        the moves of both players) have been made without a capture.
+        With neither limit given, a game can only end with a player winning, as in the original rules.
 
         The following private data members are initialized:
 
         -whose_turn_it_is (str): Keeps track of which player's turn it is. Will be either "WHITE" or "BLACK".
         Initialized to "WHITE", which means the White player will move first.
 
-        -game_state (str): Keeps track of the state of the game. Will be either 'UNFINISHED', 'WHITE_WON', or
-        'BLACK_WON'. Initialized to "UNFINISHED".
+        -game_state (str): Keeps track of the state of the game. Will be either 'UNFINISHED', 'WHITE_WON',
+        'BLACK_WON', or 'DRAW' (only when a repetition_limit or no_capture_limit is given). Initialized to "UNFINISHED".
 
         -player1: A White object. This represents the player who will use white pieces for the chess game.
 
@@ -917,28 +1375,408 @@ class ChessVar:
 
         -game_board = A GameBoard object. This represents the game board for a chess game.
 
+        -position_hash: A 64-bit Zobrist hash of the pieces on the board and whose turn it is, updated with each move.
+        Positions with the same pieces on the same squares and the same player to move have the same hash.
+
+        -move_cache: The MoveCache given, or None.
+
+        -event_stream: The EventStream (see events.py) that moves, captures, undos and the end of the game are reported
+        to, or None. Set with attach_event_stream.
+
+        -game_id: The identifier included in this game's events.
+
+        -repetition_limit, no_capture_limit: The adjudication limits given, or None.
+
+        -hash_history: An array of 64-bit integers holding the position hash after each move, starting with the
+        position before the first move, used to detect repeated positions. It is cut back by undo_move.
+
+        -capture_plies: An array holding, for each capture made, the number of moves made up to and including it, used
+        to count the moves since the last capture.
+
+        -snapshot: The BoardSnapshot of the current position, or None until get_snapshot is first called. After that,
+        a new snapshot is published after every change to the game.
+
+        -move_history: A list with one entry for each move made, holding what is needed to undo that move (the
+        squares, the moved piece, any captured piece, and whether a moved pawn was on its first move).
+
         """
         self._whose_turn_it_is = "WHITE"  # Can be either "WHITE" or "BLACK"
-        self._game_state = "UNFINISHED"  # Can be either 'UNFINISHED', 'WHITE_WON', or 'BLACK_WON'
+        self._game_state = "UNFINISHED"  # Can be either 'UNFINISHED', 'WHITE_WON', 'BLACK_WON', or 'DRAW'
         self._player1 = White()  # Initializes the player who will move White pieces.
         self._player2 = Black()  # Initializes the player who will move Black pieces.
         self._game_board = GameBoard()  # Initializes the game board for the game of chess.
+        self._position_hash = self._game_board.get_position_hash()
+        self._move_cache = move_cache
+        self._event_stream = None
+        self._game_id = None
+        self._repetition_limit = repetition_limit
+        self._no_capture_limit = no_capture_limit
+        self._hash_history = array("Q", [self._position_hash])
+        self._capture_plies = array("L")
+        self._snapshot = None
+        self._move_history = []  # (from_square, to_square, moved piece, captured piece, pawn's first move or None)
 
     def get_game_state(self):
-        """Returns 'UNFINISHED', 'WHITE_WON', or 'BLACK_WON'"""
+        """Returns 'UNFINISHED', 'WHITE_WON', 'BLACK_WON', or 'DRAW'"""
         return self._game_state
 
+    def get_repetition_count(self):
+        """Returns how many times the current position has occurred in this game (1 the first time)."""
+        # Only positions since the last capture can match, and only every other one has the same player to move.
+        first_ply = 0
+        if len(self._capture_plies) > 0:
+            first_ply = self._capture_plies[-1]
+        last_ply = len(self._hash_history) - 1
+        count = 0
+        for ply in range(last_ply, first_ply - 1, -2):
+            if self._hash_history[ply] == self._position_hash:
+                count += 1
+        return count
+
+    def get_moves_since_capture(self):
+        """Returns how many moves (by either player) have been made since the last capture, or since the start."""
+        if len(self._capture_plies) > 0:
+            return len(self._move_history) - self._capture_plies[-1]
+        return len(self._move_history)
+
+    def _adjudicate(self):
+        """Sets the game state to 'DRAW' if the move just made reached the repetition limit or the no-capture limit."""
+        if self._no_capture_limit is not None and self.get_moves_since_capture() >= self._no_capture_limit:
+            self._game_state = "DRAW"
+        elif self._repetition_limit is not None and self.get_repetition_count() >= self._repetition_limit:
+            self._game_state = "DRAW"
+
     def get_whose_turn_it_is(self):
         """Returns whose turn it is (either 'WHITE' or 'BLACK')"""
         return self._whose_turn_it_is
 
+    def get_pieces_left_to_capture(self, player):
+        """
+        Returns the dictionary of how many pieces of each type the given player ("WHITE" or "BLACK") still has to
+        capture from their opponent (see Player's get_pieces_left_to_capture).
+        """
+        if player == "WHITE":
+            return self._player1.get_pieces_left_to_capture()
+        return self._player2.get_pieces_left_to_capture()
+
+    def get_captures_needed(self, player):
+        """
+        Returns a tuple of how many more captures of each piece type (in PIECE_TYPES order) the given player ("WHITE"
+        or "BLACK") needs to win by capturing that type. Read straight from the player's counters.
+        """
+        if player == "WHITE":
+            return self._player1.get_captures_needed()
+        return self._player2.get_captures_needed()
+
+    def get_square_codes(self):
+        """Returns the game board as a list of 64 integer piece codes (see GameBoard's get_square_codes)."""
+        return self._game_board.get_square_codes()
+
+    def get_position_hash(self):
+        """Returns the 64-bit Zobrist hash of the current position (pieces on the board and whose turn it is)."""
+        return self._position_hash
+
+    def _update_position_hash(self, from_square, to_square, moved_piece, captured_piece):
+        """
+        Updates the position hash for a move of moved_piece from from_square to to_square (capturing captured_piece,
+        or None) and the change of turn. Because the update only uses XOR, calling it again with the same arguments
+        undoes it.
+        """
+        moved_code = moved_piece.get_piece_code()
+        from_index = square_to_index(from_square)
+        to_index = square_to_index(to_square)
+        position_hash = self._position_hash
+        position_hash ^= ZOBRIST_SQUARE_KEYS[moved_code][from_index] ^ ZOBRIST_SQUARE_KEYS[moved_code][to_index]
+        if captured_piece is not None:
+            position_hash ^= ZOBRIST_SQUARE_KEYS[captured_piece.get_piece_code()][to_index]
+        self._position_hash = position_hash ^ ZOBRIST_BLACK_TO_MOVE
+
+    def get_snapshot(self):
+        """
+        Returns a BoardSnapshot of the current position. Snapshots are immutable, so they can be shared with any number
+        of readers.
+
+        The first call starts snapshot publishing: from then on, make_move, undo_move and set_position replace the
+        current snapshot (with one attribute assignment) as part of each change, and later calls just return it. So
+        that readers in other threads never see a half-made move, make the first call from the thread that makes the
+        moves (or before the other threads start); after that, get_snapshot may be called from any thread.
+        """
+        if self._snapshot is None:
+            self._snapshot = BoardSnapshot(0, len(self._move_history), bytes(self.get_square_codes()),
+                                           self._whose_turn_it_is, self._game_state, self._position_hash)
+        return self._snapshot
+
+    def stop_snapshots(self):
+        """
+        Stops snapshot publishing (see get_snapshot), so changes to the game no longer build snapshots. Snapshots
+        already handed out are not affected; a later get_snapshot call starts publishing again from version 0.
+        """
+        self._snapshot = None
+
+    def _publish_snapshot(self, changes):
+        """
+        Replaces the current snapshot with the next version, after a change to the game that set each (square index,
+        square code) in changes.
+        """
+        square_codes = bytearray(self._snapshot.get_square_codes())
+        for index, code in changes:
+            square_codes[index] = code
+        self._snapshot = BoardSnapshot(self._snapshot.get_version() + 1, len(self._move_history), bytes(square_codes),
+                                       self._whose_turn_it_is, self._game_state, self._position_hash)
+
+    def get_move_history(self):
+        """Returns a list of the (from_square, to_square) moves made so far, in the order they were made."""
+        return [(record[0], record[1]) for record in self._move_history]
+
+    def validate_moves(self, moves):
+        """
+        Checks whether each of many moves would be accepted by make_move in the current position, without making any
+        of them. The game board, the pieces and whose turn it is are left unchanged.
+
+        The board is read once, and the legal squares for each from_square are worked out once and shared by every
+        move that starts on that square. This makes it much cheaper than calling make_move for each candidate (for
+        example, checking all 64 possible to_squares for the piece a user has selected).
+
+        Takes one parameter:
+        -moves: a list (or other iterable) of (from_square, to_square) pairs in algebraic notation
+
+        Returns a list of booleans in the same order as moves: True if make_move would accept that move, otherwise
+        False.
+        """
+        moves = list(moves)
+        if self._game_state != "UNFINISHED":
+            # if the game has already been won, no move is legal
+            return [False] * len(moves)
+
+        if self._move_cache is not None:
+            legal_moves = self._get_cached_legal_moves(self._whose_turn_it_is)[1]
+            return [(from_square, to_square) in legal_moves for from_square, to_square in moves]
+
+        squares = self._game_board.get_squares()
+        legal_to_squares = {}   # from_square -> set of legal to_squares, filled in as from_squares are seen
+
+        results = []
+        for from_square, to_square in moves:
+            if from_square not in legal_to_squares:
+                legal_to_squares[from_square] = set(
+                    self._get_legal_to_squares(from_square, squares, self._whose_turn_it_is))
+            results.append(to_square in legal_to_squares[from_square])
+
+        return results
+
+    def _get_legal_to_squares(self, from_square, squares, player):
+        """
+        Returns a list of the squares that the piece on from_square could legally move to, using the same checks as
+        make_move (the piece must belong to the given player, and it cannot land on its own color's piece).
+
+        Takes three parameters:
+        -from_square (str): represents the square the piece is moving from
+        -squares: a dictionary of every square on the board and the Piece object (or None) located there (from
+        GameBoard's get_squares method)
+        -player (str): the player whose move it would be, either "WHITE" or "BLACK"
+        """
+        if from_square not in squares:
+            # if the square that is being moved from is not on the board
+            return []
+
+        current_piece = squares[from_square]
+        if current_piece is None or current_piece.get_player_it_belongs_to() != player:
+            # if there is no piece of the correct color at the starting square
+            return []
+
+        legal = []
+        for to_square in current_piece.get_possible_moves(from_square, squares):
+            moving_to_status = squares[to_square]
+            if moving_to_status is None or moving_to_status.get_player_it_belongs_to() != player:
+                legal.append(to_square)
+
+        return legal
+
+    def get_position(self):
+        """
+        Returns the current position as a string: the rows of the board from row 8 down to row 1 separated by "/",
+        using PIECE_LETTERS (upper case for WHITE, lower case for BLACK) and digits for runs of empty squares, then a
+        space and "w" or "b" for whose turn it is. The starting position is
+        "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w".
+        """
+        square_codes = self._game_board.get_square_codes()
+        rows = []
+        for row in range(7, -1, -1):
+            row_text = ""
+            empty_run = 0
+            for code in square_codes[row * 8:row * 8 + 8]:
+                if code == 0:
+                    empty_run += 1
+                    continue
+                if empty_run > 0:
+                    row_text += str(empty_run)
+                    empty_run = 0
+                letter = PIECE_LETTERS[(code - 1) % len(PIECE_TYPES)]
+                if code > len(PIECE_TYPES):
+                    letter = letter.lower()
+                row_text += letter
+            if empty_run > 0:
+                row_text += str(empty_run)
+            rows.append(row_text)
+
+        if self._whose_turn_it_is == "WHITE":
+            return "/".join(rows) + " w"
+        return "/".join(rows) + " b"
+
+    def set_position(self, position):
+        """
+        Sets up the game from a position string (see get_position), for example to start from a puzzle position.
+
+        Pawns on their starting row (row 2 for WHITE, row 7 for BLACK) may still move forward two squares. The pieces
+        left to capture for each player are the opponent's pieces on the board, and the game state is 'WHITE_WON' or
+        'BLACK_WON' if a player has no pieces left of some type. The move history is cleared, so earlier moves cannot
+        be undone, and repetitions and moves without a capture are counted from this position.
+
+        Raises ValueError if the position string is not valid.
+        """
+        piece_classes = {"Pawn": Pawn, "Rook": Rook, "Knight": Knight, "Bishop": Bishop, "King": King, "Queen": Queen}
+        parts = position.split()
+        if len(parts) != 2 or parts[1] not in ["w", "b"]:
+            raise ValueError("position must be the board followed by 'w' or 'b': " + position)
+        rows = parts[0].split("/")
+        if len(rows) != 8:
+            raise ValueError("position must have 8 rows: " + position)
+
+        new_board = GameBoard()
+        pieces_on_board = {"WHITE": dict.fromkeys(PIECE_TYPES, 0), "BLACK": dict.fromkeys(PIECE_TYPES, 0)}
+        for row_number, row_text in zip(range(8, 0, -1), rows):
+            column = 0
+            for character in row_text:
+                if character.isdigit():
+                    for _ in range(int(character)):
+                        if column < 8:
+                            new_board.update_game_board("abcdefgh"[column] + str(row_number), None)
+                        column += 1
+                    continue
+                if character.upper() not in PIECE_LETTERS or column >= 8:
+                    raise ValueError("invalid row in position: " + row_text)
+                type_of_piece = PIECE_TYPES[PIECE_LETTERS.index(character.upper())]
+                if character.isupper():
+                    player = "WHITE"
+                else:
+                    player = "BLACK"
+                piece = piece_classes[type_of_piece](player)
+                if type_of_piece == "Pawn":
+                    piece.set_first_move((player == "WHITE" and row_number == 2) or
+                                         (player == "BLACK" and row_number == 7))
+                new_board.update_game_board("abcdefgh"[column] + str(row_number), piece)
+                pieces_on_board[player][type_of_piece] += 1
+                column += 1
+            if column != 8:
+                raise ValueError("row does not have 8 squares: " + row_text)
+
+        self._game_board = new_board
+        self._player1 = White()
+        self._player1.set_pieces_left_to_capture(pieces_on_board["BLACK"])
+        self._player2 = Black()
+        self._player2.set_pieces_left_to_capture(pieces_on_board["WHITE"])
+        if parts[1] == "w":
+            self._whose_turn_it_is = "WHITE"
+        else:
+            self._whose_turn_it_is = "BLACK"
+
+        self._game_state = "UNFINISHED"
+        if self._player1.check_for_win() == "WHITE_WON":
+            self._game_state = "WHITE_WON"
+        elif self._player2.check_for_win() == "BLACK_WON":
+            self._game_state = "BLACK_WON"
+
+        self._position_hash = self._game_board.get_position_hash(self._whose_turn_it_is)
+        self._move_history = []
+        self._hash_history = array("Q", [self._position_hash])
+        self._capture_plies = array("L")
+        if self._snapshot is not None:
+            self._publish_snapshot(enumerate(self.get_square_codes()))
+
+    def get_legal_moves(self, player=None):
+        """
+        Returns a list of every (from_square, to_square) move that make_move would accept for the given player, in
+        board order (a1, b1, ... h8). Nothing on the board is changed.
+
+        Takes one optional parameter:
+        -player (str): either "WHITE" or "BLACK". Defaults to the player whose turn it is. Passing the other player
+        lists the moves they could make if it were their turn (used, for example, to measure mobility).
+
+        Returns an empty list if the game has already ended.
+        """
+        if self._game_state != "UNFINISHED":
+            return []
+        if player is None:
+            player = self._whose_turn_it_is
+        if self._move_cache is not None:
+            return list(self._get_cached_legal_moves(player)[0])
+        return self._find_legal_moves(player)
+
+    def _find_legal_moves(self, player):
+        """Returns a list of every legal (from_square, to_square) move for the given player (see get_legal_moves)."""
+        squares = self._game_board.get_squares()
+        legal_moves = []
+        for from_square, current_piece in squares.items():
+            if current_piece is not None and current_piece.get_player_it_belongs_to() == player:
+                for to_square in self._get_legal_to_squares(from_square, squares, player):
+                    legal_moves.append((from_square, to_square))
+
+        return legal_moves
+
+    def _get_cached_legal_moves(self, player):
+        """
+        Returns (tuple of legal moves, frozenset of legal moves) for the given player in the current position, from the
+        move cache if it is there, otherwise working them out and adding them to the cache. The game must be
+        unfinished and have a move cache.
+        """
+        key = (self._position_hash, player)
+        entry = self._move_cache.get(key)
+        if entry is None:
+            entry = self._move_cache.put(key, self._find_legal_moves(player))
+        return entry
+
+    def attach_event_stream(self, event_stream, game_id=None):
+        """
+        Starts reporting this game's events to an EventStream (see events.py). After each move made with make_move, a
+        MOVE event is emitted, followed by a CAPTURE event if a piece was captured and a GAME_OVER event if the move
+        ended the game. undo_move emits an UNDO event. Any stream already attached is replaced.
+
+        Takes two parameters:
+        -event_stream: the EventStream (which may be shared with other games)
+        -game_id: any value identifying this game in the events (the id() of this object if not given)
+        """
+        if game_id is None:
+            game_id = id(self)
+        self._event_stream = event_stream
+        self._game_id = game_id
+
+    def detach_event_stream(self):
+        """Stops reporting this game's events. Events already emitted stay in the stream's buffer."""
+        self._event_stream = None
+        self._game_id = None
+
+    def get_event_stream(self):
+        """Returns the attached EventStream, or None."""
+        return self._event_stream
+
+    def _emit_move_events(self, from_square, to_square, captured_piece):
+        """Emits the events for a move just made by the player whose turn it still is (see attach_event_stream)."""
+        ply = len(self._move_history)
+        player = self._whose_turn_it_is
+        self._event_stream.emit(("move", self._game_id, ply, player, from_square, to_square))
+        if captured_piece is not None:
+            self._event_stream.emit(("capture", self._game_id, ply, player, to_square,
+                                     captured_piece.get_piece_type()))
+        if self._game_state != "UNFINISHED":
+            self._event_stream.emit(("game_over", self._game_id, ply, self._game_state))
+
     def make_move(self, from_square, to_square):
         """
         Attempts to move a piece on the chess board, which is labeled using "algebraic notation" (columns labeled a-h
         and rows labeled 1-8).
 
         If the square being moved from does not contain a piece belonging to the player whose turn it is,
-        or if the indicated move is not legal, or if the game has already been won, then it returns False.
+        or if the indicated move is not legal, or if the game has already ended, then it returns False.
         Otherwise, it makes the indicated move, removes any captured piece, updates the game state if necessary,
         updates whose turn it is, and returns True.
 
@@ -981,6 +1819,11 @@ class ChessVar:
                     # if the square being moved to is occupied by a piece of the same color
                     return False
 
+            if isinstance(current_piece, Pawn):
+                was_first_move = current_piece.is_first_move()    # saved so the move can be undone
+            else:
+                was_first_move = None
+
             try_move = current_piece.move(from_square, to_square, self._game_board)     # checking if a move is valid
 
             if try_move is False:   # if the Pieces class determined the move was not valid
@@ -1006,12 +1849,75 @@ class ChessVar:
 
         # remove the piece from the starting square
         self._game_board.update_game_board(from_square, None)
+        self._move_history.append((from_square, to_square, current_piece, moving_to_status, was_first_move))
+        self._update_position_hash(from_square, to_square, current_piece, moving_to_status)
+        self._hash_history.append(self._position_hash)
+        if moving_to_status is not None:
+            self._capture_plies.append(len(self._move_history))
+        if self._game_state == "UNFINISHED" and (self._repetition_limit is not None or
+                                                 self._no_capture_limit is not None):
+            self._adjudicate()
+        if self._event_stream is not None:
+            self._emit_move_events(from_square, to_square, moving_to_status)
 
         # Switch turns
         if self._whose_turn_it_is == "WHITE":
             self._whose_turn_it_is = "BLACK"
-            return True
+        else:
+            self._whose_turn_it_is = "WHITE"
+
+        if self._snapshot is not None:
+            self._publish_snapshot(((square_to_index(from_square), 0),
+                                    (square_to_index(to_square), current_piece.get_piece_code())))
+        return True
+
+    def undo_move(self):
+        """
+        Takes back the most recent move made with make_move: the moved piece goes back to its starting square, any
+        captured piece is put back (and the capturing player's pieces left to capture is restored), a pawn gets its
+        first move back if it was used, the game state returns to 'UNFINISHED', and the turn goes back to the player who
+        made the move.
 
-        if self._whose_turn_it_is == "BLACK":
+        Returns True if a move was undone, or False if no moves have been made.
+        """
+        if len(self._move_history) == 0:
+            return False
+
+        if self._event_stream is not None:
+            self._event_stream.emit(("undo", self._game_id, len(self._move_history),
+                                     self._move_history[-1][2].get_player_it_belongs_to(),
+                                     self._move_history[-1][0], self._move_history[-1][1]))
+
+        from_square, to_square, moved_piece, captured_piece, was_first_move = self._move_history.pop()
+
+        # Switch turns back to the player who made the move
+        if self._whose_turn_it_is == "WHITE":
+            self._whose_turn_it_is = "BLACK"
+        else:
             self._whose_turn_it_is = "WHITE"
-            return True
+
+        self._game_board.update_game_board(from_square, moved_piece)
+        self._game_board.update_game_board(to_square, captured_piece)
+
+        if was_first_move is not None:
+            moved_piece.set_first_move(was_first_move)
+
+        self._update_position_hash(from_square, to_square, moved_piece, captured_piece)
+        self._hash_history.pop()
+
+        if captured_piece is not None:
+            self._capture_plies.pop()
+            if self._whose_turn_it_is == "WHITE":
+                self._player1.restore_pieces_left_to_capture(captured_piece)
+            else:
+                self._player2.restore_pieces_left_to_capture(captured_piece)
+
+        self._game_state = "UNFINISHED"     # moves can only be made while the game is unfinished
+
+        if self._snapshot is not None:
+            captured_code = 0
+            if captured_piece is not None:
+                captured_code = captured_piece.get_piece_code()
+            self._publish_snapshot(((square_to_index(from_square), moved_piece.get_piece_code()),
+                                    (square_to_index(to_square), captured_code)))
+        return True
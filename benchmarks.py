@@ -0,0 +1,256 @@
+# Description: Regression benchmarks for ChessVar. Measures ChessVar() construction, make_move for each piece type
+# (rejected moves alone, accepted moves paired with undo_move), full scripted games, GameBoard.get_status_of_square, and
+# the peak memory used by 10,000 live games (as ChessVar objects and as PackedChessVar records). Results can be saved as
+# a JSON baseline, and a later run can be compared against that baseline, failing (exit status 1) when any metric is
+# worse than the baseline by more than a given fraction, or when a metric in the baseline was not measured at all (for
+# example because the benchmark was renamed or removed, which needs a new baseline).
+#
+# Usage:
+#   python benchmarks.py --save baseline.json
+#   python benchmarks.py --compare baseline.json --threshold 0.2
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+from ChessVar import ChessVar, GameBoard
+from packed_games import PackedChessVar, PackedGameStore
+
+# Moves that put each piece type in position to move, then the move being measured. For each piece type there is one
+# accepted move and one rejected move, both made from the position after the setup moves.
+PIECE_MOVE_CASES = {
+    "Pawn": ([], ("e2", "e4"), ("e2", "e5")),
+    "Rook": ([("a2", "a4"), ("h7", "h6")], ("a1", "a3"), ("a1", "b2")),
+    "Knight": ([], ("g1", "f3"), ("g1", "g3")),
+    "Bishop": ([("e2", "e3"), ("h7", "h6")], ("f1", "c4"), ("f1", "f3")),
+    "King": ([("e2", "e3"), ("h7", "h6")], ("e1", "e2"), ("e1", "e3")),
+    "Queen": ([("e2", "e3"), ("h7", "h6")], ("d1", "h5"), ("d1", "d3")),
+}
+
+# A full game played from the start, ending with BLACK capturing WHITE's only queen.
+SCRIPTED_GAME = [
+    ("e2", "e4"), ("e7", "e5"), ("g1", "f3"), ("b8", "c6"), ("f1", "c4"), ("g8", "f6"),
+    ("d2", "d3"), ("f8", "c5"), ("c1", "g5"), ("h7", "h6"), ("g5", "f6"), ("d8", "f6"),
+    ("b1", "c3"), ("d7", "d6"), ("c3", "d5"), ("f6", "d8"), ("d1", "d2"), ("c8", "g4"),
+    ("d2", "e3"), ("c5", "e3"),
+]
+
+# The metrics reported, and whether a larger value is better (True) or worse (False).
+HIGHER_IS_BETTER = {"ops_per_second": True, "peak_bytes_per_game": False}
+
+
+def _time_operation(operation, repeat):
+    """
+    Calls operation (which takes no arguments) repeat times and returns how many calls per second were made. The
+    fastest of three rounds is used, to reduce noise from other processes.
+    """
+    best_time = None
+    for _ in range(3):
+        start_time = time.perf_counter()
+        for _ in range(repeat):
+            operation()
+        elapsed = time.perf_counter() - start_time
+        if best_time is None or elapsed < best_time:
+            best_time = elapsed
+    return repeat / best_time
+
+
+def _game_after(moves):
+    """Returns a new ChessVar with the given moves already made."""
+    game = ChessVar()
+    for from_square, to_square in moves:
+        if game.make_move(from_square, to_square) is not True:
+            raise ValueError("illegal benchmark move " + from_square + to_square)
+    return game
+
+
+def benchmark_construction(repeat):
+    """Returns the number of ChessVar() objects that can be created per second."""
+    return _time_operation(ChessVar, repeat)
+
+
+def benchmark_make_move(piece_type, accepted, repeat):
+    """
+    Returns the number of make_move calls per second for the given piece type's accepted (True) or rejected (False)
+    move from PIECE_MOVE_CASES. An accepted move is undone after each call so every call starts from the same position;
+    the undo is timed as well, so for accepted moves the result is a rate for (make_move + undo_move) pairs, reported
+    under the make_undo_<piece>_accepted metric.
+    """
+    setup_moves, accepted_move, rejected_move = PIECE_MOVE_CASES[piece_type]
+    game = _game_after(setup_moves)
+
+    if accepted:
+        from_square, to_square = accepted_move
+
+        def operation():
+            if game.make_move(from_square, to_square) is not True:
+                raise ValueError("benchmark move was rejected: " + from_square + to_square)
+            game.undo_move()
+    else:
+        from_square, to_square = rejected_move
+
+        def operation():
+            if game.make_move(from_square, to_square) is not False:
+                raise ValueError("benchmark move was accepted: " + from_square + to_square)
+
+    return _time_operation(operation, repeat)
+
+
+def benchmark_scripted_game(repeat):
+    """Returns the number of complete SCRIPTED_GAME games (starting with ChessVar()) that can be played per second."""
+    def operation():
+        game = _game_after(SCRIPTED_GAME)
+        if game.get_game_state() != "BLACK_WON":
+            raise ValueError("scripted game did not end as expected")
+
+    return _time_operation(operation, repeat)
+
+
+def benchmark_get_status_of_square(repeat):
+    """Returns the number of GameBoard.get_status_of_square calls per second, looking up every square in turn."""
+    game_board = GameBoard()
+    squares = [column + str(row) for row in range(1, 9) for column in "abcdefgh"]
+
+    def operation():
+        for square in squares:
+            game_board.get_status_of_square(square)
+
+    return _time_operation(operation, repeat) * len(squares)
+
+
+def benchmark_memory(number_of_games):
+    """Returns the peak number of bytes allocated per game while number_of_games ChessVar games are alive at once."""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        games = [ChessVar() for _ in range(number_of_games)]
+        current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        del games
+    finally:
+        tracemalloc.stop()
+    return peak_bytes / number_of_games
+
+
+def benchmark_packed_memory(number_of_games):
+    """
+    Returns the peak number of bytes allocated per game while number_of_games PackedChessVar games (sharing one
+    PackedGameStore) are alive at once.
+    """
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        store = PackedGameStore()
+        games = [PackedChessVar(store) for _ in range(number_of_games)]
+        current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        del games, store
+    finally:
+        tracemalloc.stop()
+    return peak_bytes / number_of_games
+
+
+def run_benchmarks(scale=1.0):
+    """
+    Runs every benchmark and returns the results as a dictionary of metric name to {"value": number, "unit": name}.
+
+    Takes one parameter:
+    -scale (float): multiplies the number of repetitions (lower for a quick check, higher for steadier numbers)
+    """
+    def repeats(count):
+        return max(1, int(count * scale))
+
+    results = {"construction": {"value": benchmark_construction(repeats(2000)), "unit": "ops_per_second"}}
+    for piece_type in PIECE_MOVE_CASES:
+        results["make_undo_" + piece_type.lower() + "_accepted"] = {
+            "value": benchmark_make_move(piece_type, True, repeats(5000)), "unit": "ops_per_second"}
+        results["make_move_" + piece_type.lower() + "_rejected"] = {
+            "value": benchmark_make_move(piece_type, False, repeats(5000)), "unit": "ops_per_second"}
+    results["scripted_game"] = {"value": benchmark_scripted_game(repeats(200)), "unit": "ops_per_second"}
+    results["get_status_of_square"] = {"value": benchmark_get_status_of_square(repeats(2000)),
+                                       "unit": "ops_per_second"}
+    results["memory_10k_games"] = {"value": benchmark_memory(10000), "unit": "peak_bytes_per_game"}
+    results["memory_10k_packed_games"] = {"value": benchmark_packed_memory(10000), "unit": "peak_bytes_per_game"}
+    return results
+
+
+def compare_results(baseline, current, threshold):
+    """
+    Compares current results against baseline results (both from run_benchmarks).
+
+    A metric has regressed when it is worse than the baseline by more than threshold (a fraction, so 0.2 allows a 20%
+    slowdown or a 20% increase in memory), or when it is in the baseline but missing from the current results, so a
+    renamed or removed benchmark cannot make the comparison pass unnoticed. Metrics only in the current results are
+    listed but never count as regressed.
+
+    Returns a list of (metric name, baseline value, current value, change as a fraction, regressed) tuples, sorted by
+    name. The change is positive when the metric got better. For a metric missing from one set of results, that value
+    and the change are None.
+    """
+    comparison = []
+    for name in sorted(set(baseline) | set(current)):
+        if name not in current:
+            comparison.append((name, baseline[name]["value"], None, None, True))
+            continue
+        if name not in baseline:
+            comparison.append((name, None, current[name]["value"], None, False))
+            continue
+        baseline_value = baseline[name]["value"]
+        current_value = current[name]["value"]
+        change = (current_value - baseline_value) / baseline_value
+        if not HIGHER_IS_BETTER[baseline[name]["unit"]]:
+            change = -change
+        comparison.append((name, baseline_value, current_value, change, change < -threshold))
+    return comparison
+
+
+def main():
+    """
+    Command line entry point. Returns the exit status (1 if a metric regressed or a baseline metric is missing,
+    otherwise 0).
+    """
+    parser = argparse.ArgumentParser(description="ChessVar performance benchmarks")
+    parser.add_argument("--save", metavar="FILE", help="write the results to FILE as a JSON baseline")
+    parser.add_argument("--compare", metavar="FILE", help="compare the results against the JSON baseline in FILE")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="fraction by which a metric may be worse than the baseline (default 0.2)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier for the number of repetitions")
+    arguments = parser.parse_args()
+
+    results = run_benchmarks(arguments.scale)
+
+    if arguments.save:
+        with open(arguments.save, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+
+    if not arguments.compare:
+        for name in sorted(results):
+            print("%-32s %16.1f %s" % (name, results[name]["value"], results[name]["unit"]))
+        return 0
+
+    with open(arguments.compare) as baseline_file:
+        baseline = json.load(baseline_file)
+
+    regressed = False
+    for name, baseline_value, current_value, change, metric_regressed in compare_results(
+            baseline, results, arguments.threshold):
+        if current_value is None:
+            print("%-32s %16.1f %16s %9s %s" % (name, baseline_value, "-", "", "MISSING (not in the current run)"))
+            regressed = True
+        elif baseline_value is None:
+            print("%-32s %16s %16.1f %9s %s" % (name, "-", current_value, "", "new (not in the baseline)"))
+        else:
+            if metric_regressed:
+                status = "REGRESSED"
+                regressed = True
+            else:
+                status = "ok"
+            print("%-32s %16.1f %16.1f %+8.1f%% %s" % (name, baseline_value, current_value, change * 100, status))
+
+    if regressed:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
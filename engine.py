@@ -0,0 +1,231 @@
+# Description: A long-running engine that plays ChessVar over a UCI-like text protocol on stdin/stdout, so that an
+# orchestrator can start one process and send it many positions instead of starting a new Python interpreter for each
+# move. The transposition table and the legal-move cache are kept between commands, so later searches reuse the work
+# of earlier ones. Searches run in a background thread, so "stop" (and "isready") are answered while a search runs.
+#
+# Commands (one per line):
+#   uci                                       prints the engine's id lines, then "uciok"
+#   isready                                   prints "readyok"
+#   ucinewgame                                clears the transposition table and sets up the starting position
+#   position startpos [moves e2e4 e7e5 ...]   the starting position, then the given moves
+#   position fen <board> <w|b> [moves ...]    a position string from ChessVar's get_position, then the given moves
+#   go [depth N] [movetime MS] [infinite]     searches the current position; prints "info ..." and "bestmove e2e4"
+#                                             ("bestmove (none)" if there is no legal move)
+#   stop                                      ends the running search early; its best move so far is printed
+#   quit                                      stops any search and exits
+# Moves are written as the from_square followed by the to_square, for example "g1f3". Problems with a command are
+# reported as "info string ..." lines. After a "position" command that fails (a bad position string or an illegal
+# move), the engine has no position: "go" answers "bestmove (none)" until a "position" or "ucinewgame" succeeds.
+#
+# Usage:
+#   python engine.py [--hash ENTRIES]
+
+import argparse
+import sys
+import threading
+
+from ChessVar import ChessVar, MoveCache
+from search import Searcher, TranspositionTable
+
+ENGINE_NAME = "ChessVar engine"
+ENGINE_AUTHOR = "chess_variant_game contributors"
+
+# The depth searched by "go" with no depth, time limit or "infinite".
+DEFAULT_DEPTH = 4
+
+# The depth searched by "go infinite" (in practice the search runs until "stop").
+INFINITE_DEPTH = 100
+
+
+class Engine:
+    """
+    Reads protocol commands and writes responses. One Engine keeps its current position, transposition table and move
+    cache for as long as it runs.
+    """
+
+    def __init__(self, input_file=None, output_file=None, table_entries=1 << 18, move_cache_entries=100000):
+        """
+        Creates an engine set up with the starting position.
+
+        Takes four optional parameters:
+        -input_file: the text file commands are read from by run (sys.stdin if not given)
+        -output_file: the text file responses are written to (sys.stdout if not given)
+        -table_entries (int): the number of transposition table entries
+        -move_cache_entries (int): the most positions kept in the legal-move cache
+
+        Private data members:
+        -input_file, output_file: the files given
+        -output_lock: a threading.Lock held while a line is written, since the search thread writes too
+        -table: the TranspositionTable used by every search
+        -move_cache: the MoveCache shared by every position the engine is given
+        -game: the ChessVar holding the current position, or None after a "position" command failed
+        -search_thread: the thread running the current search, or None
+        -stop_event: a threading.Event set to stop the current search
+        -is_infinite_search (bool): whether the current search was started with "go infinite"
+        """
+        if input_file is None:
+            input_file = sys.stdin
+        if output_file is None:
+            output_file = sys.stdout
+        self._input_file = input_file
+        self._output_file = output_file
+        self._output_lock = threading.Lock()
+        self._table = TranspositionTable(table_entries)
+        self._move_cache = MoveCache(move_cache_entries)
+        self._game = ChessVar(self._move_cache)
+        self._search_thread = None
+        self._stop_event = threading.Event()
+        self._is_infinite_search = False
+
+    def get_game(self):
+        """Returns the ChessVar holding the current position, or None if the last "position" command failed."""
+        return self._game
+
+    def _send(self, line):
+        """Writes one line of output and flushes it, so the other end sees it at once."""
+        with self._output_lock:
+            self._output_file.write(line + "\n")
+            self._output_file.flush()
+
+    def run(self):
+        """
+        Reads and handles commands until "quit" or the end of the input. At the end of the input, a search with a depth
+        or time limit is left to finish (so "go depth 3" can be piped in), and an infinite search is stopped.
+        """
+        for line in self._input_file:
+            if not self.handle_command(line):
+                return
+        if self._is_infinite_search:
+            self.stop_search()
+        else:
+            self.wait_for_search()
+
+    def handle_command(self, line):
+        """
+        Handles one command line. Returns False if the command was "quit", otherwise True.
+        """
+        words = line.split()
+        if len(words) == 0:
+            return True
+        command = words[0]
+
+        if command == "quit":
+            self.stop_search()
+            return False
+        if command == "uci":
+            self._send("id name " + ENGINE_NAME)
+            self._send("id author " + ENGINE_AUTHOR)
+            self._send("uciok")
+        elif command == "isready":
+            self._send("readyok")
+        elif command == "ucinewgame":
+            self.stop_search()
+            self._table.clear()
+            self._game = ChessVar(self._move_cache)
+        elif command == "position":
+            self.stop_search()
+            self._set_position(words[1:])
+        elif command == "go":
+            self._go(words[1:])
+        elif command == "stop":
+            self.stop_search()
+        else:
+            self._send("info string unknown command " + command)
+        return True
+
+    def _set_position(self, words):
+        """
+        Handles the words after "position": sets up the start or given position and makes the listed moves. If that
+        fails, the engine is left with no position, so a later "go" cannot search a position the sender did not mean.
+        """
+        self._game = None
+        if "moves" in words:
+            moves = words[words.index("moves") + 1:]
+            words = words[:words.index("moves")]
+        else:
+            moves = []
+
+        game = ChessVar(self._move_cache)
+        if words[:1] == ["fen"]:
+            try:
+                game.set_position(" ".join(words[1:]))
+            except ValueError as error:
+                self._send("info string " + str(error))
+                return
+        elif words != ["startpos"]:
+            self._send("info string position must be 'startpos' or 'fen <board> <w|b>'")
+            return
+
+        for move in moves:
+            if len(move) != 4 or not game.make_move(move[:2], move[2:]):
+                self._send("info string illegal move " + move)
+                return
+        self._game = game
+
+    def _go(self, words):
+        """Handles the words after "go": starts a search of the current position in a background thread."""
+        if self._search_thread is not None and self._search_thread.is_alive():
+            self._send("info string search already running")
+            return
+        if self._game is None:
+            self._send("info string no position set; send a valid position command")
+            self._send("bestmove (none)")
+            return
+
+        max_depth = DEFAULT_DEPTH
+        time_limit = None
+        try:
+            if "infinite" in words:
+                max_depth = INFINITE_DEPTH
+            if "movetime" in words:
+                time_limit = int(words[words.index("movetime") + 1]) / 1000
+                max_depth = INFINITE_DEPTH
+            if "depth" in words:
+                max_depth = int(words[words.index("depth") + 1])
+        except (IndexError, ValueError):
+            self._send("info string go takes depth N, movetime MS or infinite")
+            return
+
+        self._is_infinite_search = "infinite" in words and time_limit is None and "depth" not in words
+        self._stop_event.clear()
+        searcher = Searcher(self._game, self._table, stop_event=self._stop_event)
+        self._search_thread = threading.Thread(target=self._search, args=(searcher, max_depth, time_limit),
+                                               daemon=True)
+        self._search_thread.start()
+
+    def _search(self, searcher, max_depth, time_limit):
+        """Runs a search (in the search thread) and reports its result."""
+        result = searcher.search(max_depth, time_limit)
+        best_move = result["best_move"]
+        if best_move is None:
+            self._send("bestmove (none)")
+            return
+        self._send("info depth %d score cp %d nodes %d time %d pv %s" % (
+            result["depth"], result["score"], result["nodes"], int(result["time"] * 1000),
+            best_move[0] + best_move[1]))
+        self._send("bestmove " + best_move[0] + best_move[1])
+
+    def stop_search(self):
+        """Stops the running search, if there is one, and waits for it to report its best move."""
+        if self._search_thread is not None:
+            self._stop_event.set()
+            self._search_thread.join()
+            self._search_thread = None
+
+    def wait_for_search(self):
+        """Waits for the running search (if any) to finish on its own and report its best move."""
+        if self._search_thread is not None:
+            self._search_thread.join()
+            self._search_thread = None
+
+
+def main():
+    """Command line entry point: runs the engine on stdin and stdout."""
+    parser = argparse.ArgumentParser(description="ChessVar engine with a UCI-like protocol")
+    parser.add_argument("--hash", type=int, default=1 << 18, help="number of transposition table entries")
+    arguments = parser.parse_args()
+    Engine(table_entries=arguments.hash).run()
+
+
+if __name__ == "__main__":
+    main()
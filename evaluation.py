@@ -0,0 +1,303 @@
+# Description: Position evaluation for engines built on top of ChessVar. A position is scored (in centipawns, from
+# WHITE's point of view) from three parts: material, piece-square tables, and a "capture risk" term that follows the
+# variant's win condition (the fewer pieces of a type a player has left, the closer their opponent is to winning by
+# capturing all of them). An optional mobility term counts legal moves for each player. The Evaluator class keeps the
+# score up to date as moves are made and undone, so scoring a leaf position does not need a full rescan of the board.
+# The evaluate_batch function scores many positions at once with NumPy (an optional dependency).
+
+try:
+    import numpy as np
+except ImportError:     # NumPy is only needed for evaluate_batch
+    np = None
+
+from ChessVar import PIECE_TYPES, square_to_index
+
+# Material value of each piece type, in PIECE_TYPES order (Pawn, Rook, Knight, Bishop, King, Queen). The King is not a
+# special piece in this variant, so it is valued like a minor piece; losing it is covered by the capture risk term.
+PIECE_VALUES = [100, 500, 320, 330, 300, 900]
+
+# Score for a finished game. A player with 0 pieces left of some type has lost, so RISK_BY_PIECES_LEFT[0] is this.
+WIN_SCORE = 100000
+
+# Bonus for a player when their opponent has this many pieces of a type left (indexed by the number left). Having a
+# single piece of a type left is dangerous, since losing it loses the game.
+RISK_BY_PIECES_LEFT = [WIN_SCORE, 350, 120, 60, 30, 20, 12, 8, 5]
+
+# Points for each legal move a player has, when mobility is included.
+MOBILITY_WEIGHT = 4
+
+# Piece-square tables from WHITE's point of view, in PIECE_TYPES order. Each table lists the 64 squares in the order
+# a1, b1, ... h1, a2, ... h8 (one row of the board per line, starting with row 1). BLACK pieces use the same tables
+# mirrored top to bottom.
+PIECE_SQUARE_TABLES = [
+    [   0,   0,   0,   0,   0,   0,   0,   0,      # Pawn
+        5,  10,  10, -20, -20,  10,  10,   5,
+        5,  -5, -10,   0,   0, -10,  -5,   5,
+        0,   0,   0,  20,  20,   0,   0,   0,
+        5,   5,  10,  25,  25,  10,   5,   5,
+       10,  10,  20,  30,  30,  20,  10,  10,
+       50,  50,  50,  50,  50,  50,  50,  50,
+        0,   0,   0,   0,   0,   0,   0,   0],
+    [   0,   0,   0,   5,   5,   0,   0,   0,      # Rook
+       -5,   0,   0,   0,   0,   0,   0,  -5,
+       -5,   0,   0,   0,   0,   0,   0,  -5,
+       -5,   0,   0,   0,   0,   0,   0,  -5,
+       -5,   0,   0,   0,   0,   0,   0,  -5,
+       -5,   0,   0,   0,   0,   0,   0,  -5,
+        5,  10,  10,  10,  10,  10,  10,   5,
+        0,   0,   0,   0,   0,   0,   0,   0],
+    [ -50, -40, -30, -30, -30, -30, -40, -50,      # Knight
+      -40, -20,   0,   5,   5,   0, -20, -40,
+      -30,   5,  10,  15,  15,  10,   5, -30,
+      -30,   0,  15,  20,  20,  15,   0, -30,
+      -30,   5,  15,  20,  20,  15,   5, -30,
+      -30,   0,  10,  15,  15,  10,   0, -30,
+      -40, -20,   0,   0,   0,   0, -20, -40,
+      -50, -40, -30, -30, -30, -30, -40, -50],
+    [ -20, -10, -10, -10, -10, -10, -10, -20,      # Bishop
+      -10,   5,   0,   0,   0,   0,   5, -10,
+      -10,  10,  10,  10,  10,  10,  10, -10,
+      -10,   0,  10,  10,  10,  10,   0, -10,
+      -10,   5,   5,  10,  10,   5,   5, -10,
+      -10,   0,   5,  10,  10,   5,   0, -10,
+      -10,   0,   0,   0,   0,   0,   0, -10,
+      -20, -10, -10, -10, -10, -10, -10, -20],
+    [  10,  20,  10,   0,   0,  10,  20,  10,      # King (kept away from the center, where it is easy to attack)
+        0,   0, -10, -10, -10, -10,   0,   0,
+      -10, -20, -20, -20, -20, -20, -20, -10,
+      -20, -30, -30, -40, -40, -30, -30, -20,
+      -30, -40, -40, -50, -50, -40, -40, -30,
+      -30, -40, -40, -50, -50, -40, -40, -30,
+      -30, -40, -40, -50, -50, -40, -40, -30,
+      -30, -40, -40, -50, -50, -40, -40, -30],
+    [ -20, -10, -10,  -5,  -5, -10, -10, -20,      # Queen
+      -10,   0,   5,   0,   0,   0,   0, -10,
+      -10,   5,   5,   5,   5,   5,   0, -10,
+        0,   0,   5,   5,   5,   5,   0,  -5,
+       -5,   0,   5,   5,   5,   5,   0,  -5,
+      -10,   0,   5,   5,   5,   5,   0, -10,
+      -10,   0,   0,   0,   0,   0,   0, -10,
+      -20, -10, -10,  -5,  -5, -10, -10, -20],
+]
+
+
+def _build_code_square_scores():
+    """
+    Combines PIECE_VALUES and PIECE_SQUARE_TABLES into one table of 13 rows (one per square code, see PIECE_TYPES) by
+    64 squares, holding what a piece with that code on that square adds to WHITE's score. Row 0 (empty) is all zeros
+    and the BLACK rows are negative.
+    """
+    table = [[0] * 64]
+    for color_sign in [1, -1]:
+        for type_index in range(len(PIECE_TYPES)):
+            row = []
+            for square in range(64):
+                if color_sign == 1:
+                    table_square = square
+                else:
+                    table_square = square ^ 56      # the same column on the mirrored row
+                row.append(color_sign * (PIECE_VALUES[type_index] + PIECE_SQUARE_TABLES[type_index][table_square]))
+            table.append(row)
+    return table
+
+
+CODE_SQUARE_SCORES = _build_code_square_scores()
+
+
+def _risk(pieces_left):
+    """Returns the RISK_BY_PIECES_LEFT bonus for an opponent having pieces_left of a type (more than 8 counts as 8)."""
+    return RISK_BY_PIECES_LEFT[min(pieces_left, len(RISK_BY_PIECES_LEFT) - 1)]
+
+
+def _count_codes(square_codes):
+    """Returns a list of 13 counts: how many squares hold each square code."""
+    counts = [0] * 13
+    for code in square_codes:
+        counts[code] += 1
+    return counts
+
+
+def _static_score(square_codes):
+    """
+    Returns the material, piece-square and capture risk score of a board given as 64 square codes, from WHITE's point
+    of view.
+    """
+    score = 0
+    for square, code in enumerate(square_codes):
+        score += CODE_SQUARE_SCORES[code][square]
+
+    counts = _count_codes(square_codes)
+    number_of_types = len(PIECE_TYPES)
+    for type_index in range(number_of_types):
+        score += _risk(counts[number_of_types + 1 + type_index])    # BLACK pieces left for WHITE to capture
+        score -= _risk(counts[1 + type_index])                      # WHITE pieces left for BLACK to capture
+    return score
+
+
+def mobility_score(game):
+    """
+    Returns MOBILITY_WEIGHT times the difference between the number of legal moves WHITE and BLACK could make in the
+    given ChessVar position (0 if the game is finished).
+    """
+    white_moves = len(game.get_legal_moves("WHITE"))
+    black_moves = len(game.get_legal_moves("BLACK"))
+    return MOBILITY_WEIGHT * (white_moves - black_moves)
+
+
+def evaluate(game, include_mobility=True):
+    """
+    Scores a ChessVar position from scratch, in centipawns from WHITE's point of view (positive is good for WHITE).
+
+    The capture risk term uses the capture counters kept by each Player (see ChessVar's get_captures_needed), so a
+    finished game scores about +WIN_SCORE (WHITE won) or -WIN_SCORE (BLACK won).
+
+    Takes two parameters:
+    -game: a ChessVar object
+    -include_mobility (bool): whether to add the mobility term, which is the slowest part
+    """
+    score = 0
+    for square, code in enumerate(game.get_square_codes()):
+        score += CODE_SQUARE_SCORES[code][square]
+
+    for pieces_left in game.get_captures_needed("WHITE"):
+        score += _risk(pieces_left)
+    for pieces_left in game.get_captures_needed("BLACK"):
+        score -= _risk(pieces_left)
+
+    if include_mobility:
+        score += mobility_score(game)
+    return score
+
+
+class Evaluator:
+    """
+    Keeps a running evaluation of a ChessVar game that is updated as moves are made and undone.
+
+    All moves on the game must be made and undone through the Evaluator (not directly on the ChessVar object), so that
+    its copy of the board stays in step. Each move only changes the score for the two squares involved and, for a
+    capture, the capture risk of one piece type, so scoring a position after a move is constant time.
+    """
+
+    def __init__(self, game):
+        """
+        Creates an Evaluator for the given ChessVar game (in any position) by scoring it once from scratch.
+
+        Private data members:
+        -game: the ChessVar object being evaluated
+        -square_codes: a list of the 64 square codes, kept in step with the game's board
+        -code_counts: how many squares hold each of the 13 square codes
+        -score: the current material, piece-square and capture risk score, from WHITE's point of view
+        -changes: a list with one (from_index, to_index, moved code, captured code, score before) entry per move made
+        """
+        self._game = game
+        self._square_codes = game.get_square_codes()
+        self._code_counts = _count_codes(self._square_codes)
+        self._score = _static_score(self._square_codes)
+        self._changes = []
+
+    def get_game(self):
+        """Returns the ChessVar object being evaluated."""
+        return self._game
+
+    def get_square_codes(self):
+        """Returns the Evaluator's list of the 64 square codes of the current position (do not modify it)."""
+        return self._square_codes
+
+    def make_move(self, from_square, to_square):
+        """
+        Makes a move on the game (see ChessVar's make_move) and, if it was accepted, updates the score.
+
+        Returns the result of ChessVar's make_move (True if the move was made, otherwise False).
+        """
+        if self._game.make_move(from_square, to_square) is not True:
+            return False
+
+        from_index = square_to_index(from_square)
+        to_index = square_to_index(to_square)
+        moved_code = self._square_codes[from_index]
+        captured_code = self._square_codes[to_index]
+        self._changes.append((from_index, to_index, moved_code, captured_code, self._score))
+
+        score = self._score
+        score += CODE_SQUARE_SCORES[moved_code][to_index] - CODE_SQUARE_SCORES[moved_code][from_index]
+        if captured_code != 0:
+            score -= CODE_SQUARE_SCORES[captured_code][to_index]
+            pieces_left = self._code_counts[captured_code]
+            change_in_risk = _risk(pieces_left - 1) - _risk(pieces_left)
+            if captured_code > len(PIECE_TYPES):    # a BLACK piece was captured, which helps WHITE
+                score += change_in_risk
+            else:
+                score -= change_in_risk
+            self._code_counts[captured_code] -= 1
+
+        self._square_codes[to_index] = moved_code
+        self._square_codes[from_index] = 0
+        self._score = score
+        return True
+
+    def undo_move(self):
+        """
+        Undoes the most recent move made through this Evaluator (see ChessVar's undo_move) and restores the score.
+
+        Returns True if a move was undone, or False if there was nothing to undo.
+        """
+        if len(self._changes) == 0:
+            return False
+
+        self._game.undo_move()
+        from_index, to_index, moved_code, captured_code, previous_score = self._changes.pop()
+        self._square_codes[from_index] = moved_code
+        self._square_codes[to_index] = captured_code
+        if captured_code != 0:
+            self._code_counts[captured_code] += 1
+        self._score = previous_score
+        return True
+
+    def get_score(self, include_mobility=False):
+        """
+        Returns the current score from WHITE's point of view. This matches evaluate(game, include_mobility) for the
+        same position.
+        """
+        if include_mobility:
+            return self._score + mobility_score(self._game)
+        return self._score
+
+    def get_score_for_player_to_move(self, include_mobility=False):
+        """Returns the current score from the point of view of the player whose turn it is (as used by negamax)."""
+        score = self.get_score(include_mobility)
+        if self._game.get_whose_turn_it_is() == "BLACK":
+            return -score
+        return score
+
+
+def evaluate_batch(square_codes):
+    """
+    Scores many positions in one vectorized NumPy call. Requires NumPy.
+
+    Takes one parameter:
+    -square_codes: an array-like of shape (number of positions, 64) holding the square codes of each board (for example
+    built from ChessVar's get_square_codes)
+
+    Returns a NumPy array of int64 scores from WHITE's point of view, equal to evaluate(game, include_mobility=False)
+    for each position. Mobility is left out, since it needs full move generation for each position.
+    """
+    if np is None:
+        raise ImportError("evaluate_batch requires NumPy")
+
+    codes = np.asarray(square_codes, dtype=np.intp)
+    if codes.ndim != 2 or codes.shape[1] != 64:
+        raise ValueError("square_codes must have shape (number of positions, 64)")
+
+    code_square_scores = np.asarray(CODE_SQUARE_SCORES, dtype=np.int64)
+    scores = code_square_scores[codes, np.arange(64)].sum(axis=1)
+
+    # counts[position, code] is how many squares in that position hold the code
+    counts = np.zeros((codes.shape[0], 13), dtype=np.intp)
+    np.add.at(counts, (np.arange(codes.shape[0])[:, None], codes), 1)
+    counts = np.minimum(counts, len(RISK_BY_PIECES_LEFT) - 1)
+
+    risk = np.asarray(RISK_BY_PIECES_LEFT, dtype=np.int64)
+    number_of_types = len(PIECE_TYPES)
+    scores += risk[counts[:, number_of_types + 1:]].sum(axis=1)
+    scores -= risk[counts[:, 1:number_of_types + 1]].sum(axis=1)
+    return scores
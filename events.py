@@ -0,0 +1,139 @@
+# Description: A low-overhead stream of game events for analytics. A ChessVar with an EventStream attached (see
+# ChessVar's attach_event_stream) reports every move, capture (with the captured piece's type), undo and game-over
+# transition as a small tuple. Events from any number of games are appended to the stream's one buffer and handed to
+# the subscribed sinks in batches, so each move costs one tuple and one list append however many sinks are listening,
+# and a game with no stream attached pays only for one "is None" check per move.
+#
+# A sink is any callable that takes a list of events, so a callback function can be subscribed directly; queue_sink
+# and JsonLinesSink send batches to a queue (for example one read by another thread or process) or write them to a file.
+
+import json
+
+MOVE = "move"               # (MOVE, game id, ply, player, from_square, to_square)
+CAPTURE = "capture"         # (CAPTURE, game id, ply, player, square, captured piece type)
+UNDO = "undo"               # (UNDO, game id, ply, player, from_square, to_square)
+GAME_OVER = "game_over"     # (GAME_OVER, game id, ply, game state)
+
+# The names of the fields of each type of event, after the event type (used by event_to_dict).
+EVENT_FIELDS = {
+    MOVE: ("game_id", "ply", "player", "from_square", "to_square"),
+    CAPTURE: ("game_id", "ply", "player", "square", "piece_type"),
+    UNDO: ("game_id", "ply", "player", "from_square", "to_square"),
+    GAME_OVER: ("game_id", "ply", "game_state"),
+}
+
+
+def event_to_dict(event):
+    """Returns an event tuple as a dictionary with an "event" key for its type and one key per field."""
+    event_dict = {"event": event[0]}
+    event_dict.update(zip(EVENT_FIELDS[event[0]], event[1:]))
+    return event_dict
+
+
+class EventStream:
+    """
+    Collects events from any number of games in one buffer and passes them to every subscribed sink in batches of
+    batch_size events (or fewer, when flush is called). Sinks receive the same list object, which they must not change.
+
+    An EventStream is meant to be used from one thread. Copying a ChessVar with copy.deepcopy shares its EventStream;
+    pickling one gives an EventStream with no sinks and an empty buffer.
+    """
+
+    def __init__(self, batch_size=256):
+        """
+        Creates a stream with no sinks.
+
+        Takes one optional parameter:
+        -batch_size (int): how many events are buffered before they are passed to the sinks (1 passes every event on
+        at once)
+
+        Private data members:
+        -batch_size (int): the number of events in a full batch
+        -buffer: a list of the events not yet passed to the sinks
+        -sinks: a list of the subscribed sinks, in the order they were subscribed
+        -number_of_events (int): how many events have been emitted in total
+        """
+        self._batch_size = batch_size
+        self._buffer = []
+        self._sinks = []
+        self._number_of_events = 0
+
+    def __deepcopy__(self, memo):
+        """Returns this same stream, so that copies of a game keep reporting to it."""
+        return self
+
+    def __getstate__(self):
+        """Returns the state to pickle: only the batch size (sinks are often files or queues that cannot be sent)."""
+        return {"batch_size": self._batch_size}
+
+    def __setstate__(self, state):
+        """Restores a pickled stream as one with no sinks and the same batch size."""
+        self.__init__(state["batch_size"])
+
+    def subscribe(self, sink):
+        """Adds a sink: a callable that takes a list of events. Returns the sink, so it can be unsubscribed later."""
+        self._sinks.append(sink)
+        return sink
+
+    def unsubscribe(self, sink):
+        """Removes a subscribed sink. Returns True if it was removed, or False if it was not subscribed."""
+        if sink not in self._sinks:
+            return False
+        self._sinks.remove(sink)
+        return True
+
+    def has_sinks(self):
+        """Returns True if any sink is subscribed."""
+        return len(self._sinks) > 0
+
+    def get_number_of_events(self):
+        """Returns how many events have been emitted to this stream."""
+        return self._number_of_events
+
+    def emit(self, event):
+        """Adds one event tuple to the buffer, passing the buffer on to the sinks once it holds a full batch."""
+        self._buffer.append(event)
+        self._number_of_events += 1
+        if len(self._buffer) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        """Passes every buffered event to the sinks now (if there are any) and empties the buffer."""
+        if len(self._buffer) == 0:
+            return
+        batch = self._buffer
+        self._buffer = []
+        for sink in self._sinks:
+            sink(batch)
+
+    def close(self):
+        """Flushes the buffer and removes every sink."""
+        self.flush()
+        self._sinks = []
+
+
+def queue_sink(event_queue):
+    """
+    Returns a sink that puts each batch (as a list of event tuples) on event_queue, for example a queue.Queue read by
+    another thread or a multiprocessing.Queue read by another process.
+    """
+    def sink(batch):
+        event_queue.put(batch)
+
+    return sink
+
+
+class JsonLinesSink:
+    """A sink that writes each event to a text file as one line of JSON (see event_to_dict)."""
+
+    def __init__(self, file):
+        """
+        Takes one parameter:
+        -file: a text file opened for writing (it is not closed by the sink)
+        """
+        self._file = file
+
+    def __call__(self, batch):
+        """Writes a batch of events to the file, one line per event."""
+        self._file.write("".join(json.dumps(event_to_dict(event)) + "\n" for event in batch))
+        self._file.flush()
@@ -0,0 +1,337 @@
+# Description: A differential fuzz harness that checks a candidate implementation of the game against the reference
+# ChessVar. Seeded random games are played through both in lockstep: each step tries either a legal move or a random
+# (often illegal) pair of squares, some of them off the board or not square names at all, and after every step the
+# harness compares whether the move was accepted, the board contents (square codes), whose turn it is, and
+# get_game_state(). Any divergence is shrunk to a minimal sequence of attempted moves that still shows it. Games are
+# split across worker processes by seed.
+#
+# A candidate is any class that can be created with no arguments and has make_move, get_game_state,
+# get_whose_turn_it_is and get_square_codes methods (for example PackedChessVar from packed_games.py, the default).
+#
+# With --check-move-generation, the harness instead checks ChessVar against itself: in every position of each random
+# game, get_legal_moves and validate_moves must agree exactly with which of the 4096 (from_square, to_square) pairs
+# make_move accepts. The move generators (get_possible_moves) are a second copy of the movement rules in Pieces.move,
+# so this catches the two drifting apart.
+#
+# Usage:
+#   python fuzz.py --games 100000 --workers 8
+#   python fuzz.py --candidate packed_games:PackedChessVar --seed 1000
+#   python fuzz.py --check-move-generation --games 200
+
+import argparse
+import importlib
+import multiprocessing
+import random
+import sys
+
+from ChessVar import ChessVar, index_to_square
+
+ALL_SQUARES = [index_to_square(index) for index in range(64)]
+
+# Square strings that are off the board or malformed, so that make_move's boundary checks are compared too.
+BAD_SQUARES = ["i1", "h9", "a0", "i9", "z5", "a10", "", "e", "e22", "E2", "2e", " e2", "e2 ", "-1"]
+
+# Chance that a step tries a random pair of squares instead of a legal move.
+RANDOM_ATTEMPT_RATE = 0.25
+
+# Chance that each square of a random attempt is taken from BAD_SQUARES instead of the board.
+BAD_SQUARE_RATE = 0.1
+
+
+def load_candidate(candidate_name):
+    """Returns the candidate class named "module:ClassName"."""
+    module_name, class_name = candidate_name.split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def fuzz_game(seed, max_moves, candidate_class):
+    """
+    Plays the random game with the given seed (at most max_moves attempted moves) through the reference ChessVar and
+    a candidate in lockstep. Each step tries a random legal move of the reference game or, at RANDOM_ATTEMPT_RATE, a
+    random pair of squares (each one off the board or malformed at BAD_SQUARE_RATE). The same seed always gives the
+    same attempts.
+
+    Returns (list of attempted moves up to and including the first divergence, divergence dictionary or None). See
+    find_divergence for the divergence dictionary.
+    """
+    rng = random.Random(seed)
+    reference = ChessVar()
+    candidate = candidate_class()
+    attempts = []
+    try:
+        while len(attempts) < max_moves and reference.get_game_state() == "UNFINISHED":
+            legal_moves = reference.get_legal_moves()
+            if len(legal_moves) == 0 or rng.random() < RANDOM_ATTEMPT_RATE:
+                move = (_random_square(rng), _random_square(rng))
+            else:
+                move = rng.choice(legal_moves)
+            attempts.append(move)
+            divergence = _compare_step(reference, candidate, move, len(attempts) - 1)
+            if divergence is not None:
+                return attempts, divergence
+        return attempts, None
+    finally:
+        _release(candidate)
+
+
+def _random_square(rng):
+    """Returns a random square for a random attempt: usually one on the board, at BAD_SQUARE_RATE a bad one."""
+    if rng.random() < BAD_SQUARE_RATE:
+        return rng.choice(BAD_SQUARES)
+    return rng.choice(ALL_SQUARES)
+
+
+def _observe(game):
+    """Returns what is compared between implementations: (square codes, whose turn it is, game state)."""
+    return list(game.get_square_codes()), game.get_whose_turn_it_is(), game.get_game_state()
+
+
+def _compare_step(reference, candidate, move, step):
+    """
+    Makes one attempted move on both the reference and the candidate, and returns None if they agree afterwards,
+    otherwise a divergence dictionary (see find_divergence).
+    """
+    from_square, to_square = move
+    reference_result = (reference.make_move(from_square, to_square),) + _observe(reference)
+    candidate_result = (candidate.make_move(from_square, to_square),) + _observe(candidate)
+    if reference_result != candidate_result:
+        return {"step": step, "move": move, "reference": reference_result, "candidate": candidate_result}
+    return None
+
+
+def _release(candidate):
+    """Gives a candidate's storage back if it has a release method (as PackedChessVar does)."""
+    release = getattr(candidate, "release", None)
+    if release is not None:
+        release()
+
+
+def find_divergence(attempts, candidate_class):
+    """
+    Replays attempts through a new reference ChessVar and a new candidate in lockstep.
+
+    Returns None if they agree after every attempt, otherwise a dictionary describing the first divergence:
+    "step" (the index of the attempt), "move", and the "reference" and "candidate" results, each a tuple of (make_move
+    result, square codes, whose turn it is, game state).
+    """
+    reference = ChessVar()
+    candidate = candidate_class()
+    try:
+        for step, move in enumerate(attempts):
+            divergence = _compare_step(reference, candidate, move, step)
+            if divergence is not None:
+                return divergence
+        return None
+    finally:
+        _release(candidate)
+
+
+def shrink(attempts, candidate_class):
+    """
+    Shrinks a list of attempts that shows a divergence to a smaller list that still does (delta debugging). Chunks of
+    attempts are removed, halving the chunk size each pass; chunks of one or two attempts (a single move, or one move
+    by each player) are tried at every position. Passes repeat until nothing more can be removed.
+
+    Returns the shrunk list of attempts.
+    """
+    divergence = find_divergence(attempts, candidate_class)
+    if divergence is None:
+        return attempts
+    attempts = attempts[:divergence["step"] + 1]    # nothing after the first divergence is needed
+
+    removed_any = True
+    while removed_any:
+        removed_any = False
+        chunk_size = max(1, len(attempts) // 2)
+        while chunk_size >= 1:
+            start = 0
+            while start + chunk_size <= len(attempts):
+                smaller = attempts[:start] + attempts[start + chunk_size:]
+                divergence = find_divergence(smaller, candidate_class)
+                if divergence is not None:
+                    attempts = smaller[:divergence["step"] + 1]
+                    removed_any = True
+                elif chunk_size <= 2:
+                    start += 1
+                else:
+                    start += chunk_size
+            chunk_size //= 2
+    return attempts
+
+
+def check_seeds(candidate_name, first_seed, number_of_games, max_moves):
+    """
+    Fuzzes number_of_games games with seeds first_seed, first_seed + 1, ... against the named candidate.
+
+    Returns (number of games checked, number of attempted moves, list of failures). Each failure is a dictionary with
+    the "seed", the shrunk "attempts" and the "divergence" they show.
+    """
+    candidate_class = load_candidate(candidate_name)
+    failures = []
+    total_attempts = 0
+    for seed in range(first_seed, first_seed + number_of_games):
+        attempts, divergence = fuzz_game(seed, max_moves, candidate_class)
+        total_attempts += len(attempts)
+        if divergence is not None:
+            shrunk = shrink(attempts, candidate_class)
+            failures.append({"seed": seed, "attempts": shrunk,
+                             "divergence": find_divergence(shrunk, candidate_class)})
+    return number_of_games, total_attempts, failures
+
+
+ALL_PAIRS = [(from_square, to_square) for from_square in ALL_SQUARES for to_square in ALL_SQUARES]
+
+
+def check_move_generation(game):
+    """
+    Checks get_legal_moves and validate_moves against make_move in the current position of a ChessVar: every one of
+    the 4096 (from_square, to_square) pairs is tried with make_move (and undone if accepted). The game ends up
+    unchanged.
+
+    Returns None if they agree, otherwise a dictionary with the pairs make_move accepts that get_legal_moves leaves
+    out ("missing"), the pairs get_legal_moves lists that make_move rejects ("extra"), and the pairs validate_moves
+    gets wrong ("validate_wrong").
+    """
+    accepted = set()
+    for from_square, to_square in ALL_PAIRS:
+        if game.make_move(from_square, to_square):
+            accepted.add((from_square, to_square))
+            game.undo_move()
+
+    legal_moves = set(game.get_legal_moves())
+    validate_wrong = [pair for pair, is_valid in zip(ALL_PAIRS, game.validate_moves(ALL_PAIRS))
+                      if is_valid != (pair in accepted)]
+    if legal_moves == accepted and len(validate_wrong) == 0:
+        return None
+    return {"missing": sorted(accepted - legal_moves), "extra": sorted(legal_moves - accepted),
+            "validate_wrong": validate_wrong}
+
+
+def check_move_generation_seeds(first_seed, number_of_games, max_moves):
+    """
+    Plays number_of_games random games (seeds first_seed, first_seed + 1, ...) of at most max_moves legal moves and
+    runs check_move_generation in every position.
+
+    Returns (number of games checked, number of positions checked, list of failures). Each failure is a dictionary
+    with the "seed", the "moves" leading to the position, and the mismatch from check_move_generation.
+    """
+    failures = []
+    positions_checked = 0
+    for seed in range(first_seed, first_seed + number_of_games):
+        rng = random.Random(seed)
+        game = ChessVar()
+        moves = []
+        while True:
+            positions_checked += 1
+            mismatch = check_move_generation(game)
+            if mismatch is not None:
+                failures.append({"seed": seed, "moves": list(moves), "mismatch": mismatch})
+                break
+            legal_moves = game.get_legal_moves()
+            if len(moves) >= max_moves or len(legal_moves) == 0:
+                break
+            move = rng.choice(legal_moves)
+            game.make_move(move[0], move[1])
+            moves.append(move)
+    return number_of_games, positions_checked, failures
+
+
+def _check_move_generation_task(arguments):
+    """Runs check_move_generation_seeds for one batch of seeds in a worker process."""
+    return check_move_generation_seeds(*arguments)
+
+
+def run_move_generation_check(games, first_seed=0, max_moves=200, workers=None, batch_size=10):
+    """
+    Runs check_move_generation_seeds on games seeded games, split into batches across worker processes.
+
+    Returns (number of games checked, number of positions checked, list of failures from every batch).
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    batches = []
+    for batch_start in range(first_seed, first_seed + games, batch_size):
+        batches.append((batch_start, min(batch_size, first_seed + games - batch_start), max_moves))
+
+    games_checked = 0
+    positions_checked = 0
+    failures = []
+    with multiprocessing.Pool(workers) as pool:
+        for batch_games, batch_positions, batch_failures in pool.imap_unordered(_check_move_generation_task, batches):
+            games_checked += batch_games
+            positions_checked += batch_positions
+            failures += batch_failures
+    failures.sort(key=lambda failure: failure["seed"])
+    return games_checked, positions_checked, failures
+
+
+def _check_seeds_task(arguments):
+    """Runs check_seeds for one batch of seeds in a worker process."""
+    return check_seeds(*arguments)
+
+
+def run_fuzz(candidate_name, games, first_seed=0, max_moves=200, workers=None, batch_size=100):
+    """
+    Fuzzes games seeded games against the named candidate, split into batches across worker processes.
+
+    Returns (number of games checked, number of attempted moves, list of failures from every batch).
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    batches = []
+    for batch_start in range(first_seed, first_seed + games, batch_size):
+        batch_games = min(batch_size, first_seed + games - batch_start)
+        batches.append((candidate_name, batch_start, batch_games, max_moves))
+
+    games_checked = 0
+    attempts_checked = 0
+    failures = []
+    with multiprocessing.Pool(workers) as pool:
+        for batch_games, batch_attempts, batch_failures in pool.imap_unordered(_check_seeds_task, batches):
+            games_checked += batch_games
+            attempts_checked += batch_attempts
+            failures += batch_failures
+    failures.sort(key=lambda failure: failure["seed"])
+    return games_checked, attempts_checked, failures
+
+
+def main():
+    """Command line entry point. Returns the exit status (1 if any divergence or mismatch was found, otherwise 0)."""
+    parser = argparse.ArgumentParser(description="Differential fuzzing of a ChessVar implementation")
+    parser.add_argument("--candidate", default="packed_games:PackedChessVar",
+                        help="the implementation to check, as module:ClassName")
+    parser.add_argument("--games", type=int, default=1000, help="number of random games")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--max-moves", type=int, default=200, help="most attempted moves per game")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--check-move-generation", action="store_true",
+                        help="check get_legal_moves and validate_moves against make_move instead of a candidate")
+    arguments = parser.parse_args()
+
+    if arguments.check_move_generation:
+        games_checked, positions_checked, failures = run_move_generation_check(
+            arguments.games, arguments.seed, arguments.max_moves, arguments.workers)
+        print("checked %d games, %d positions, %d mismatches" % (games_checked, positions_checked, len(failures)))
+        for failure in failures:
+            print("seed %d after %s" % (failure["seed"], failure["moves"]))
+            print("    %s" % (failure["mismatch"],))
+        if failures:
+            return 1
+        return 0
+
+    games_checked, attempts_checked, failures = run_fuzz(arguments.candidate, arguments.games, arguments.seed,
+                                                         arguments.max_moves, arguments.workers)
+    print("checked %d games, %d attempted moves, %d divergences" % (games_checked, attempts_checked, len(failures)))
+    for failure in failures:
+        print("seed %d: %s" % (failure["seed"], failure["attempts"]))
+        print("    diverged at step %d %s" % (failure["divergence"]["step"], failure["divergence"]["move"]))
+        print("    reference: %s" % (failure["divergence"]["reference"],))
+        print("    candidate: %s" % (failure["divergence"]["candidate"],))
+
+    if failures:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+# Description: Compact storage for many ChessVar games in one process. Each game's complete state is a fixed-size
+# record of bytes inside one shared bytearray owned by a PackedGameStore, instead of a ChessVar object with a GameBoard
+# of eight dictionaries, two Players and 32 Pieces objects. PackedChessVar objects are thin views onto one record and
+# offer the same make_move, get_game_state and get_whose_turn_it_is methods as ChessVar, following exactly the same
+# rules (including how the King and BLACK pawns move toward the a-file). The record layout and the move tables come
+# from a compiled variant (see variants.py); standard ChessVar records are 86 bytes: 64 square codes, whose turn it
+# is, the game state, 8 bytes of pawn first-move bits, and 12 capture counters.
+
+from variants import STANDARD_RULES
+
+
+class PackedGameStore:
+    """
+    Holds the state of many games of one variant in one bytearray, one fixed-size record per game. A game is
+    identified by its slot number (its record starts at byte slot * record size). Slots of released games are reused
+    by new games. Using a slot that is not held (released, or never created) raises ValueError.
+    """
+
+    def __init__(self, rules=None):
+        """
+        Creates an empty store.
+
+        Takes one optional parameter:
+        -rules: the compiled VariantRules of the games to hold (STANDARD_RULES if not given)
+
+        Private data members:
+        -rules: the VariantRules used to check and make moves
+        -record_size: the number of bytes in each game's record
+        -data: the bytearray holding every game's record
+        -free_slots: a list of slots whose games have been released and can be reused
+        -free_slot_set: the same slots as a set, to check quickly whether a slot is free
+        """
+        if rules is None:
+            rules = STANDARD_RULES
+        self._rules = rules
+        self._record_size = rules.get_record_size()
+        self._data = bytearray()
+        self._free_slots = []
+        self._free_slot_set = set()
+
+    def get_rules(self):
+        """Returns the VariantRules of the games in this store."""
+        return self._rules
+
+    def new_game(self):
+        """Creates a game in the starting position and returns its slot number."""
+        if len(self._free_slots) > 0:
+            slot = self._free_slots.pop()
+            self._free_slot_set.remove(slot)
+            base = slot * self._record_size
+            self._data[base:base + self._record_size] = self._rules.get_start_record()
+        else:
+            slot = len(self._data) // self._record_size
+            self._data += self._rules.get_start_record()
+        return slot
+
+    def release_game(self, slot):
+        """
+        Marks the game in the given slot as finished with, so its slot can be reused by a new game.
+
+        Raises ValueError if the slot is not held (for example if it was already released), since releasing it twice
+        would let two new games share one record.
+        """
+        self._check_slot(slot)
+        self._free_slots.append(slot)
+        self._free_slot_set.add(slot)
+
+    def _check_slot(self, slot):
+        """Raises ValueError if the given slot does not hold a game (it is out of range or has been released)."""
+        if not 0 <= slot < len(self._data) // self._record_size or slot in self._free_slot_set:
+            raise ValueError("slot %r does not hold a game" % (slot,))
+
+    def get_number_of_games(self):
+        """Returns how many games are currently held (not counting released ones)."""
+        return len(self._data) // self._record_size - len(self._free_slots)
+
+    def get_memory_size(self):
+        """Returns the number of bytes used by the records (all slots, including released ones)."""
+        return len(self._data)
+
+    def get_record(self, slot):
+        """Returns a copy of the bytes of the record for the given slot."""
+        self._check_slot(slot)
+        base = slot * self._record_size
+        return bytes(self._data[base:base + self._record_size])
+
+    def get_game(self, slot):
+        """Returns a PackedChessVar view of the game in the given slot."""
+        self._check_slot(slot)
+        return PackedChessVar(self, slot)
+
+    def get_game_state(self, slot):
+        """Returns 'UNFINISHED', 'WHITE_WON', or 'BLACK_WON' for the game in the given slot."""
+        self._check_slot(slot)
+        return self._rules.get_game_state(self._data, slot * self._record_size)
+
+    def get_whose_turn_it_is(self, slot):
+        """Returns whose turn it is ('WHITE' or 'BLACK') in the game in the given slot."""
+        self._check_slot(slot)
+        return self._rules.get_whose_turn_it_is(self._data, slot * self._record_size)
+
+    def get_square_codes(self, slot):
+        """Returns the square codes of the game in the given slot, as a list (see GameBoard's get_square_codes)."""
+        self._check_slot(slot)
+        base = slot * self._record_size
+        return list(self._data[base:base + self._rules.get_number_of_squares()])
+
+    def get_pieces_left_to_capture(self, slot, player):
+        """
+        Returns a dictionary of how many pieces of each type the given player ("WHITE" or "BLACK") still has to capture
+        in the game in the given slot.
+        """
+        self._check_slot(slot)
+        return self._rules.get_pieces_left_to_capture(self._data, slot * self._record_size, player)
+
+    def make_move(self, slot, from_square, to_square):
+        """
+        Attempts a move in the game in the given slot, with the same rules and results as ChessVar's make_move.
+
+        Returns True if the move was made, or False if it was not legal (or the game is already finished).
+        """
+        self._check_slot(slot)
+        return self._rules.make_move(self._data, slot * self._record_size, from_square, to_square)
+
+
+class PackedChessVar:
+    """
+    A ChessVar game (or a game of another variant) stored as one record in a PackedGameStore. This object only holds
+    the store and the slot number; all of the game's state is in the store's bytearray.
+
+    Offers the same make_move, get_game_state, get_whose_turn_it_is, get_square_codes and get_pieces_left_to_capture
+    methods as ChessVar.
+    """
+
+    __slots__ = ["_store", "_slot"]
+
+    def __init__(self, store=None, slot=None):
+        """
+        Creates a view onto a game.
+
+        Takes two optional parameters:
+        -store: the PackedGameStore holding the game. DEFAULT_STORE is used if none is given.
+        -slot (int): the slot of an existing game in the store. A new game is created if none is given.
+        """
+        if store is None:
+            store = DEFAULT_STORE
+        if slot is None:
+            slot = store.new_game()
+        self._store = store
+        self._slot = slot
+
+    def get_store(self):
+        """Returns the PackedGameStore holding this game."""
+        return self._store
+
+    def get_slot(self):
+        """Returns the slot number of this game in its store."""
+        return self._slot
+
+    def get_game_state(self):
+        """Returns 'UNFINISHED', 'WHITE_WON', or 'BLACK_WON'"""
+        return self._store.get_game_state(self._slot)
+
+    def get_whose_turn_it_is(self):
+        """Returns whose turn it is (either 'WHITE' or 'BLACK')"""
+        return self._store.get_whose_turn_it_is(self._slot)
+
+    def get_square_codes(self):
+        """Returns the game board as a list of integer piece codes (see GameBoard's get_square_codes)."""
+        return self._store.get_square_codes(self._slot)
+
+    def get_pieces_left_to_capture(self, player):
+        """Returns the dictionary of how many pieces of each type the given player still has to capture."""
+        return self._store.get_pieces_left_to_capture(self._slot, player)
+
+    def make_move(self, from_square, to_square):
+        """Attempts a move, with the same rules and results as ChessVar's make_move. Returns True or False."""
+        return self._store.make_move(self._slot, from_square, to_square)
+
+    def release(self):
+        """
+        Gives this game's slot back to the store for reuse. This view then no longer refers to any game: using it (or
+        releasing it again) raises ValueError.
+        """
+        self._store.release_game(self._slot)
+        self._slot = -1     # never a valid slot, so the store rejects any later use of this view
+
+
+# The store used by PackedChessVar() when no store is given.
+DEFAULT_STORE = PackedGameStore()
@@ -0,0 +1,541 @@
+# Description: Game-tree search for ChessVar. The Searcher class runs an iterative deepening alpha-beta (negamax)
+# search using the evaluation module, with a transposition table keyed by ChessVar's position hash. The
+# parallel_search function runs a "Lazy SMP" search: several worker processes search the same root position, each with
+# a slightly different move ordering, and share one transposition table placed in multiprocessing shared memory so
+# that each worker benefits from the others' results. Table entries are written without locks; each entry stores its
+# key XOR its data, so a half-written entry is detected and ignored when read. Running this file with --bench reports
+# the speedup of parallel_search against the number of workers on a fixed set of benchmark positions.
+
+import argparse
+import copy
+import multiprocessing
+import queue
+import random
+import time
+from multiprocessing import shared_memory
+
+from ChessVar import ChessVar, PIECE_TYPES, square_to_index
+from evaluation import Evaluator, PIECE_VALUES, WIN_SCORE
+
+# Flags stored with a transposition table score, saying how the score relates to the true value of the position.
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# Scores at least this large mean a forced win was found (WIN_SCORE minus the number of moves to reach it).
+WIN_THRESHOLD = WIN_SCORE - 1000
+INFINITE_SCORE = WIN_SCORE + 1
+
+# Bytes used by one transposition table entry (two unsigned 64-bit numbers).
+ENTRY_SIZE = 16
+
+# Seconds parallel_search waits for a helper's result before checking whether the helpers are still running, and
+# seconds it waits for a stopped helper to exit before terminating it.
+HELPER_POLL_INTERVAL = 0.1
+HELPER_JOIN_TIMEOUT = 5.0
+
+# Positions used by the --bench mode, as lists of moves from the start position.
+BENCHMARK_POSITIONS = [
+    [],
+    [("e2", "e4"), ("e7", "e5")],
+    [("d2", "d4"), ("d7", "d5"), ("c2", "c4")],
+    [("g1", "f3"), ("b8", "c6"), ("e2", "e4"), ("e7", "e5"), ("f1", "c4")],
+    [("e2", "e4"), ("d7", "d5"), ("e4", "d5"), ("d8", "d5"), ("b1", "c3")],
+    [("c2", "c4"), ("e7", "e5"), ("b1", "c3"), ("g8", "f6"), ("g2", "g3"), ("d7", "d5")],
+]
+
+
+class SearchStopped(Exception):
+    """Raised inside a search when it has been told to stop or has run out of time."""
+    pass
+
+
+class TranspositionTable:
+    """
+    A fixed-size table of search results, indexed by position hash.
+
+    The table lives in a plain buffer of 16-byte entries, so it can be placed in a bytearray (for one process) or in a
+    multiprocessing shared memory block (shared by several processes). Each entry holds two unsigned 64-bit numbers:
+    the position hash XOR the packed data, and the packed data itself. Writes are not locked; if two processes write
+    the same entry at once and it ends up mixed, the check key == first ^ second fails and the entry is treated as
+    empty.
+
+    Packed data layout (low bits first): score + 2**31 (32 bits), depth (8 bits), flag (2 bits), move (13 bits; 0 for
+    no move, otherwise from_index * 64 + to_index + 1).
+    """
+
+    def __init__(self, number_of_entries=1 << 16, buffer=None):
+        """
+        Creates a transposition table with the given number of entries.
+
+        Takes two parameters:
+        -number_of_entries (int): how many entries the table holds
+        -buffer: an optional writable buffer of at least number_of_entries * ENTRY_SIZE bytes to hold the table (for
+        example a SharedMemory's buf). A new zero-filled bytearray is used if none is given.
+        """
+        if buffer is None:
+            buffer = bytearray(number_of_entries * ENTRY_SIZE)
+        self._number_of_entries = number_of_entries
+        self._slots = memoryview(buffer)[:number_of_entries * ENTRY_SIZE].cast("Q")
+
+    def get_number_of_entries(self):
+        """Returns how many entries the table holds."""
+        return self._number_of_entries
+
+    def probe(self, position_hash):
+        """
+        Looks up a position.
+
+        Returns (depth, flag, score, move) if the table has an entry for position_hash, otherwise None. The move is a
+        (from_square_index, to_square_index) pair or None.
+        """
+        slot = (position_hash % self._number_of_entries) * 2
+        checked_key = self._slots[slot]
+        data = self._slots[slot + 1]
+        if checked_key ^ data != position_hash or data == 0:
+            return None
+
+        score = (data & 0xFFFFFFFF) - (1 << 31)
+        depth = (data >> 32) & 0xFF
+        flag = (data >> 40) & 0x3
+        move_code = (data >> 42) & 0x1FFF
+        if move_code == 0:
+            move = None
+        else:
+            move = divmod(move_code - 1, 64)
+        return depth, flag, score, move
+
+    def store(self, position_hash, depth, flag, score, move):
+        """
+        Stores a search result for a position. An existing entry for a different position is always replaced; an
+        existing entry for the same position is only replaced by a search of at least the same depth.
+
+        Takes five parameters:
+        -position_hash (int): the position's 64-bit hash
+        -depth (int): how many moves deep the position was searched (0-255)
+        -flag (int): EXACT, LOWER_BOUND or UPPER_BOUND
+        -score (int): the score, from the point of view of the player to move
+        -move: the best (from_square_index, to_square_index) pair found, or None
+        """
+        slot = (position_hash % self._number_of_entries) * 2
+        existing = self.probe(position_hash)
+        if existing is not None and existing[0] > depth:
+            return
+
+        if move is None:
+            move_code = 0
+        else:
+            move_code = move[0] * 64 + move[1] + 1
+        data = (score + (1 << 31)) | (depth << 32) | (flag << 40) | (move_code << 42)
+        self._slots[slot] = position_hash ^ data
+        self._slots[slot + 1] = data
+
+    def clear(self):
+        """Empties every entry in the table."""
+        for slot in range(len(self._slots)):
+            self._slots[slot] = 0
+
+    def close(self):
+        """Releases the table's view of its buffer (needed before a SharedMemory block can be closed)."""
+        self._slots.release()
+
+
+class Searcher:
+    """
+    Runs an iterative deepening alpha-beta search from a ChessVar position.
+
+    The Searcher works on its own copy of the game, so the game passed in is not changed. Scores are in centipawns
+    from the point of view of the player to move; a forced win scores WIN_SCORE minus the number of moves needed.
+    """
+
+    def __init__(self, game, table=None, worker_id=0, stop_event=None):
+        """
+        Creates a Searcher for the given ChessVar position.
+
+        Takes four parameters:
+        -game: the ChessVar object to search from (copied; not changed by the search)
+        -table: a TranspositionTable to use (may be shared with other Searchers). A new one is made if none is given.
+        -worker_id (int): 0 for the main search. Other ids shuffle the order of non-capturing moves using the id as a
+        random seed, so parallel workers explore the tree in different orders.
+        -stop_event: an optional threading or multiprocessing Event; the search stops soon after it is set
+        """
+        if table is None:
+            table = TranspositionTable()
+        self._evaluator = Evaluator(copy.deepcopy(game))
+        self._game = self._evaluator.get_game()
+        self._game.detach_event_stream()    # moves tried during the search are not real moves of the game
+        self._game.stop_snapshots()         # nor are they changes for readers of the game's snapshots
+        self._table = table
+        self._worker_id = worker_id
+        self._random = random.Random(worker_id)
+        self._stop_event = stop_event
+        self._deadline = None
+        self._nodes = 0
+
+    def get_nodes(self):
+        """Returns how many positions have been searched so far."""
+        return self._nodes
+
+    def search(self, max_depth, time_limit=None):
+        """
+        Searches to depth 1, then 2, and so on up to max_depth, or until time_limit seconds have passed or the stop
+        event is set. A search that is cut short returns the result of the last depth that finished (or, if the first
+        move of the unfinished depth was searched, the best move found so far at that depth).
+
+        Returns a dictionary with:
+        -"best_move": the best (from_square, to_square) move found, or None if there are no legal moves
+        -"score": the score of the best move, from the point of view of the player to move
+        -"depth": the deepest search that finished
+        -"nodes": the number of positions searched
+        -"time": the number of seconds the search took
+        """
+        start_time = time.monotonic()
+        if time_limit is not None:
+            self._deadline = start_time + time_limit
+        self._nodes = 0
+
+        result = {"best_move": None, "score": 0, "depth": 0}
+        root_moves = self._game.get_legal_moves()
+        if len(root_moves) > 0:
+            result["best_move"] = root_moves[0]
+
+        for depth in range(1, max_depth + 1):
+            try:
+                score, best_move = self._search_root(root_moves, depth, result)
+            except SearchStopped:
+                break
+            result = {"best_move": best_move, "score": score, "depth": depth}
+            if abs(score) >= WIN_THRESHOLD:
+                break   # a forced win or loss was found; searching deeper will not change it
+
+        result["nodes"] = self._nodes
+        result["time"] = time.monotonic() - start_time
+        return result
+
+    def _search_root(self, root_moves, depth, result):
+        """
+        Searches every root move to the given depth and returns (best score, best move). The best move from the
+        previous depth is searched first. If the search is stopped after the first move, result is updated with the
+        best move found so far before SearchStopped is raised again.
+        """
+        previous_best = result["best_move"]
+        ordered_moves = self._order_moves(root_moves, None)
+        if previous_best in ordered_moves:
+            ordered_moves.remove(previous_best)
+            ordered_moves.insert(0, previous_best)
+
+        alpha = -INFINITE_SCORE
+        best_move = None
+        for move in ordered_moves:
+            self._evaluator.make_move(move[0], move[1])
+            try:
+                score = -self._negamax(depth - 1, -INFINITE_SCORE, -alpha, 1)
+            except SearchStopped:
+                if best_move is not None:
+                    result["best_move"] = best_move
+                    result["score"] = alpha
+                raise
+            finally:
+                self._evaluator.undo_move()
+
+            if score > alpha or best_move is None:
+                alpha = score
+                best_move = move
+
+        position_hash = self._game.get_position_hash()
+        self._table.store(position_hash, depth, EXACT, alpha, _move_to_indexes(best_move))
+        return alpha, best_move
+
+    def _negamax(self, depth, alpha, beta, ply):
+        """
+        Returns the score of the current position searched to the given depth, from the point of view of the player to
+        move, using alpha-beta pruning between alpha and beta. ply is the distance from the root.
+        """
+        self._nodes += 1
+        if self._nodes % 1024 == 0:
+            self._check_stop()
+
+        game = self._game
+        game_state = game.get_game_state()
+        if game_state != "UNFINISHED":
+            if game_state == "DRAW":
+                return 0
+            return -(WIN_SCORE - ply)   # the previous move won the game for the other player
+
+        if depth == 0:
+            return self._evaluator.get_score_for_player_to_move()
+
+        position_hash = game.get_position_hash()
+        table_move = None
+        entry = self._table.probe(position_hash)
+        if entry is not None:
+            entry_depth, flag, entry_score, table_move = entry
+            if entry_depth >= depth:
+                entry_score = _score_from_table(entry_score, ply)
+                if flag == EXACT:
+                    return entry_score
+                if flag == LOWER_BOUND and entry_score >= beta:
+                    return entry_score
+                if flag == UPPER_BOUND and entry_score <= alpha:
+                    return entry_score
+
+        moves = self._order_moves(game.get_legal_moves(), table_move)
+        if len(moves) == 0:
+            return 0    # the player to move is stuck; neither side can make progress
+
+        original_alpha = alpha
+        best_score = -INFINITE_SCORE
+        best_move = None
+        for move in moves:
+            self._evaluator.make_move(move[0], move[1])
+            try:
+                score = -self._negamax(depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                self._evaluator.undo_move()
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break   # the opponent will avoid this position, so the other moves need not be searched
+
+        if best_score <= original_alpha:
+            flag = UPPER_BOUND
+        elif best_score >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self._table.store(position_hash, depth, flag, _score_to_table(best_score, ply), _move_to_indexes(best_move))
+        return best_score
+
+    def _order_moves(self, moves, table_move):
+        """
+        Returns the moves sorted so that the transposition table move comes first, then captures (most valuable
+        captured piece first, least valuable capturing piece breaking ties), then all other moves. Workers other than 0
+        shuffle the non-capturing moves.
+        """
+        square_codes = self._evaluator.get_square_codes()
+        number_of_types = len(PIECE_TYPES)
+        keyed_moves = []
+        for move in moves:
+            from_index = square_to_index(move[0])
+            to_index = square_to_index(move[1])
+            if (from_index, to_index) == table_move:
+                key = 1000000
+            elif square_codes[to_index] != 0:
+                victim_type = (square_codes[to_index] - 1) % number_of_types
+                attacker_type = (square_codes[from_index] - 1) % number_of_types
+                key = 10000 + 10 * PIECE_VALUES[victim_type] - PIECE_VALUES[attacker_type]
+            elif self._worker_id != 0:
+                key = self._random.random()
+            else:
+                key = 0
+            keyed_moves.append((key, move))
+
+        keyed_moves.sort(key=lambda keyed_move: keyed_move[0], reverse=True)
+        return [move for key, move in keyed_moves]
+
+    def _check_stop(self):
+        """Raises SearchStopped if the stop event is set or the time limit has passed."""
+        if self._stop_event is not None and self._stop_event.is_set():
+            raise SearchStopped()
+        if self._deadline is not None and time.monotonic() >= self._deadline:
+            raise SearchStopped()
+
+
+def _move_to_indexes(move):
+    """Returns a (from_square, to_square) move as a pair of square indexes, or None for no move."""
+    if move is None:
+        return None
+    return square_to_index(move[0]), square_to_index(move[1])
+
+
+def _score_to_table(score, ply):
+    """
+    Converts a win or loss score found ply moves from the root into one measured from the stored position, so the
+    same entry is correct when the position is reached at a different distance from the root.
+    """
+    if score >= WIN_THRESHOLD:
+        return score + ply
+    if score <= -WIN_THRESHOLD:
+        return score - ply
+    return score
+
+
+def _score_from_table(score, ply):
+    """Reverses _score_to_table for a position reached ply moves from the root."""
+    if score >= WIN_THRESHOLD:
+        return score - ply
+    if score <= -WIN_THRESHOLD:
+        return score + ply
+    return score
+
+
+def search(game, max_depth, time_limit=None, table=None):
+    """
+    Searches the given ChessVar position in this process (see Searcher's search method) and returns the result
+    dictionary.
+    """
+    return Searcher(game, table).search(max_depth, time_limit)
+
+
+def _parallel_search_worker(game, memory_name, number_of_entries, max_depth, worker_id, stop_event, result_queue,
+                            time_limit):
+    """
+    Runs one helper worker of parallel_search in a child process: attaches to the shared transposition table, searches
+    until finished or stopped, and puts the number of positions it searched on result_queue. Something is always put
+    on result_queue (0 nodes if the helper fails), so parallel_search never waits for a result that will not come.
+    """
+    nodes = 0
+    memory = None
+    table = None
+    try:
+        memory = shared_memory.SharedMemory(name=memory_name)
+        table = TranspositionTable(number_of_entries, memory.buf)
+        searcher = Searcher(game, table, worker_id, stop_event)
+        nodes = searcher.search(max_depth, time_limit)["nodes"]
+    finally:
+        if table is not None:
+            table.close()
+        if memory is not None:
+            memory.close()
+        result_queue.put(nodes)
+
+
+def _collect_helper_nodes(helpers, result_queue):
+    """
+    Returns the total number of positions searched by the helper processes of parallel_search, read from
+    result_queue. Stops waiting once every helper has exited, so a helper that died without reporting (for example one
+    that was killed) counts as 0 instead of hanging the search.
+    """
+    nodes = 0
+    results_left = len(helpers)
+    while results_left > 0:
+        try:
+            nodes += result_queue.get(timeout=HELPER_POLL_INTERVAL)
+            results_left -= 1
+        except queue.Empty:
+            if not any(helper.is_alive() for helper in helpers):
+                break
+    while results_left > 0:     # results put just before the last helper exited may still be on their way
+        try:
+            nodes += result_queue.get(timeout=HELPER_POLL_INTERVAL)
+            results_left -= 1
+        except queue.Empty:
+            break
+    return nodes
+
+
+def parallel_search(game, max_depth, workers=2, table_entries=1 << 18, time_limit=None):
+    """
+    Searches the given ChessVar position with "Lazy SMP": the main search runs in this process while workers - 1
+    helper processes search the same position with shuffled move orders (every other helper one move deeper). All of
+    them share a transposition table in shared memory. The search ends when the main search finishes; the helpers are
+    then stopped.
+
+    Takes five parameters:
+    -game: the ChessVar object to search from (not changed)
+    -max_depth (int): the depth the main search goes to
+    -workers (int): the total number of searching processes, including this one
+    -table_entries (int): the number of transposition table entries (16 bytes each)
+    -time_limit: an optional number of seconds after which the search stops
+
+    Returns the main search's result dictionary (see Searcher's search method), with "nodes" counting the positions
+    searched by every worker. Whether the search finishes or raises, the helpers are stopped and joined before the
+    shared memory is released.
+    """
+    context = multiprocessing.get_context()
+    memory = shared_memory.SharedMemory(create=True, size=table_entries * ENTRY_SIZE)
+    table = TranspositionTable(table_entries, memory.buf)
+    stop_event = context.Event()
+    result_queue = context.Queue()
+    helpers = []
+    try:
+        table.clear()
+        for worker_id in range(1, workers):
+            helper_depth = max_depth + worker_id % 2
+            helper = context.Process(target=_parallel_search_worker,
+                                     args=(game, memory.name, table_entries, helper_depth, worker_id, stop_event,
+                                           result_queue, time_limit))
+            helper.start()
+            helpers.append(helper)
+
+        result = Searcher(game, table, 0, stop_event).search(max_depth, time_limit)
+
+        stop_event.set()
+        result["nodes"] += _collect_helper_nodes(helpers, result_queue)
+        return result
+
+    finally:
+        stop_event.set()
+        for helper in helpers:
+            helper.join(HELPER_JOIN_TIMEOUT)
+            if helper.is_alive():
+                helper.terminate()
+                helper.join()
+        table.close()
+        memory.close()
+        memory.unlink()
+
+
+def benchmark_parallel_search(worker_counts, max_depth, positions=None, table_entries=1 << 18):
+    """
+    Times parallel_search on a fixed set of positions for each number of workers.
+
+    Takes four parameters:
+    -worker_counts: a list of worker counts to try (the first is the baseline for the speedup)
+    -max_depth (int): the search depth used for every position
+    -positions: lists of moves from the start position (BENCHMARK_POSITIONS if not given)
+    -table_entries (int): the number of transposition table entries
+
+    Returns a list of dictionaries, one per worker count, with "workers", "time" (total seconds), "nodes" (total
+    positions searched by all workers), and "speedup" (baseline time divided by this time).
+    """
+    if positions is None:
+        positions = BENCHMARK_POSITIONS
+
+    games = []
+    for moves in positions:
+        game = ChessVar()
+        for from_square, to_square in moves:
+            if game.make_move(from_square, to_square) is not True:
+                raise ValueError("illegal benchmark move " + from_square + to_square)
+        games.append(game)
+
+    report = []
+    for workers in worker_counts:
+        total_time = 0.0
+        total_nodes = 0
+        for game in games:
+            start_time = time.monotonic()
+            result = parallel_search(game, max_depth, workers, table_entries)
+            total_time += time.monotonic() - start_time
+            total_nodes += result["nodes"]
+        report.append({"workers": workers, "time": total_time, "nodes": total_nodes})
+
+    for line in report:
+        line["speedup"] = report[0]["time"] / line["time"]
+    return report
+
+
+def main():
+    """Command line entry point: with --bench, prints the parallel search speedup table."""
+    parser = argparse.ArgumentParser(description="ChessVar alpha-beta search")
+    parser.add_argument("--bench", action="store_true", help="report speedup against the number of workers")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="worker counts to benchmark")
+    parser.add_argument("--depth", type=int, default=3, help="search depth")
+    arguments = parser.parse_args()
+
+    if arguments.bench:
+        print("workers      time     nodes   speedup")
+        for line in benchmark_parallel_search(arguments.workers, arguments.depth):
+            print("%7d %9.2f %9d %9.2f" % (line["workers"], line["time"], line["nodes"], line["speedup"]))
+    else:
+        result = search(ChessVar(), arguments.depth)
+        print(result)
+
+
+if __name__ == "__main__":
+    main()
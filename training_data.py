@@ -0,0 +1,173 @@
+# Description: Training-data export for policy/value models. Game logs (lists of moves from the starting position) are
+# replayed on compact byte records (see variants.py and packed_games.py) rather than ChessVar objects, and the record
+# before each move is copied into one bytearray. Each batch is then turned into NumPy arrays in a few vectorized
+# operations: one 0/1 plane per piece code, the player to move, the pieces each player has left to capture, the move
+# played (the policy target) and the final result of the game (the value target). iter_training_batches yields the
+# batches; write_shards saves them as .npy files that load_shard opens memory-mapped, so training can stream them
+# without copying. NumPy is required (it is an optional dependency of the rest of the project).
+#
+# Arrays in each batch (N positions, T piece types, a board of R rows and C columns):
+#   "planes": uint8 (N, 2T, R, C); plane k is 1 where a piece with square code k + 1 stands (WHITE's types, then
+#       BLACK's, in PIECE_TYPES order). Row 0 is row 1 of the board.
+#   "side_to_move": uint8 (N,); 0 when WHITE is to move, 1 when BLACK is
+#   "pieces_left": uint8 (N, 2, T); how many pieces of each type WHITE (then BLACK) still has to capture to win
+#   "moves": int32 (N,); the move played, as from_index * (R * C) + to_index (square indexes as in square_to_index)
+#   "outcomes": int8 (N,); the game's result for the player to move: 1 won, -1 lost, 0 unfinished
+
+import os
+
+try:
+    import numpy as np
+except ImportError:     # NumPy is needed for every function in this module
+    np = None
+
+from variants import STANDARD_RULES
+
+# The arrays in each batch, in the order they are written to a shard.
+ARRAY_NAMES = ["planes", "side_to_move", "pieces_left", "moves", "outcomes"]
+
+
+def _require_numpy():
+    """Raises ImportError if NumPy is not installed."""
+    if np is None:
+        raise ImportError("training_data requires NumPy")
+
+
+def replay_game(moves, rules=None):
+    """
+    Replays one game log on a byte record.
+
+    Takes two parameters:
+    -moves: the game's moves, as a list of (from_square, to_square) pairs starting from the starting position
+    -rules: the compiled VariantRules of the game (STANDARD_RULES if not given)
+
+    Returns (bytes of the record before each move, concatenated; list of (from_index, to_index) moves; final game
+    state index: 0 unfinished, 1 WHITE won, 2 BLACK won).
+
+    Raises ValueError if a move is not legal.
+    """
+    if rules is None:
+        rules = STANDARD_RULES
+    record = bytearray(rules.get_start_record())
+    state_offset = rules.get_record_offsets()["state"]
+    records = bytearray()
+    move_indexes = []
+    for from_square, to_square in moves:
+        records += record
+        if not rules.make_move(record, 0, from_square, to_square):
+            raise ValueError("illegal move in game log: " + from_square + to_square)
+        move_indexes.append((rules.get_square_index(from_square), rules.get_square_index(to_square)))
+    return records, move_indexes, record[state_offset]
+
+
+def _make_batch(records, move_targets, outcomes, rules):
+    """Converts the buffered records, move targets and outcomes of one batch into the arrays of a batch."""
+    offsets = rules.get_record_offsets()
+    number_of_squares = rules.get_number_of_squares()
+    number_of_types = len(rules.get_piece_types())
+    columns, rows = rules.get_board_size()
+
+    data = np.frombuffer(bytes(records), dtype=np.uint8).reshape(-1, rules.get_record_size())
+    codes = data[:, :number_of_squares]
+    piece_codes = np.arange(1, 2 * number_of_types + 1, dtype=np.uint8)
+    planes = (codes[:, None, :] == piece_codes[None, :, None]).astype(np.uint8)
+    side_to_move = data[:, offsets["turn"]].copy()
+    counters = data[:, offsets["counters"]:offsets["counters"] + 2 * number_of_types]
+
+    # Outcomes are stored from WHITE's point of view while buffering; flip them when BLACK is to move.
+    outcomes = np.asarray(outcomes, dtype=np.int8)
+    outcomes[side_to_move == 1] *= -1
+
+    return {
+        "planes": planes.reshape(-1, 2 * number_of_types, rows, columns),
+        "side_to_move": side_to_move,
+        "pieces_left": counters.reshape(-1, 2, number_of_types).copy(),
+        "moves": np.asarray(move_targets, dtype=np.int32),
+        "outcomes": outcomes,
+    }
+
+
+def iter_training_batches(game_logs, batch_size=4096, rules=None):
+    """
+    Replays game logs and yields the positions before each move in batches (see the module description for the
+    arrays in a batch). Batches hold batch_size positions, except the last, which may hold fewer. Positions keep the
+    order of the games and of the moves within each game.
+
+    Takes three parameters:
+    -game_logs: an iterable of game logs, each a list of (from_square, to_square) moves from the starting position
+    -batch_size (int): the number of positions in each batch
+    -rules: the compiled VariantRules of the games (STANDARD_RULES if not given)
+
+    Yields dictionaries of array name to NumPy array. Raises ValueError if a game log has an illegal move.
+    """
+    _require_numpy()
+    if rules is None:
+        rules = STANDARD_RULES
+    record_size = rules.get_record_size()
+    number_of_squares = rules.get_number_of_squares()
+    white_outcome = [0, 1, -1]  # by final game state index: unfinished, WHITE won, BLACK won
+
+    records = bytearray()
+    move_targets = []
+    outcomes = []
+    for moves in game_logs:
+        game_records, move_indexes, final_state = replay_game(moves, rules)
+        records += game_records
+        move_targets += [from_index * number_of_squares + to_index for from_index, to_index in move_indexes]
+        outcomes += [white_outcome[final_state]] * len(move_indexes)
+        while len(move_targets) >= batch_size:
+            yield _make_batch(records[:batch_size * record_size], move_targets[:batch_size],
+                              outcomes[:batch_size], rules)
+            del records[:batch_size * record_size]
+            del move_targets[:batch_size]
+            del outcomes[:batch_size]
+    if len(move_targets) > 0:
+        yield _make_batch(records, move_targets, outcomes, rules)
+
+
+def write_shards(game_logs, directory, shard_size=65536, rules=None):
+    """
+    Replays game logs and writes the positions to .npy shards of shard_size positions each (the last may be smaller).
+    Shard i is saved as one file per array, named "shard-<i>-<array name>.npy" with i as five digits.
+
+    Takes four parameters:
+    -game_logs: an iterable of game logs (see iter_training_batches)
+    -directory (str): the directory to write to (created if it does not exist)
+    -shard_size (int): the number of positions in each shard
+    -rules: the compiled VariantRules of the games (STANDARD_RULES if not given)
+
+    Returns the number of shards written.
+    """
+    _require_numpy()
+    os.makedirs(directory, exist_ok=True)
+    number_of_shards = 0
+    for batch in iter_training_batches(game_logs, shard_size, rules):
+        for name in ARRAY_NAMES:
+            np.save(_shard_path(directory, number_of_shards, name), batch[name])
+        number_of_shards += 1
+    return number_of_shards
+
+
+def _shard_path(directory, shard_index, name):
+    """Returns the path of one array of one shard."""
+    return os.path.join(directory, "shard-%05d-%s.npy" % (shard_index, name))
+
+
+def load_shard(directory, shard_index, mmap=True):
+    """
+    Returns the arrays of one shard written by write_shards, as a dictionary of array name to NumPy array. With mmap
+    True (the default), the arrays are read-only memory maps of the files, so nothing is read until it is used.
+    """
+    _require_numpy()
+    mmap_mode = None
+    if mmap:
+        mmap_mode = "r"
+    return {name: np.load(_shard_path(directory, shard_index, name), mmap_mode=mmap_mode) for name in ARRAY_NAMES}
+
+
+def count_shards(directory):
+    """Returns the number of shards written to directory by write_shards."""
+    number_of_shards = 0
+    while os.path.exists(_shard_path(directory, number_of_shards, ARRAY_NAMES[0])):
+        number_of_shards += 1
+    return number_of_shards
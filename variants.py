@@ -0,0 +1,485 @@
+# Description: A rule-definition layer for spin-off variants of ChessVar (different board sizes, extra piece types,
+# and different "capture all of a type" targets). A variant is described by a plain dictionary (see STANDARD_VARIANT)
+# and compiled once by compile_variant into a VariantRules object. Compiling works out, for every piece type and
+# square, the squares it can jump to, the squares it can slide to (with the squares in between that must be empty),
+# and the pawn moves, along with the starting record and the starting capture counters. VariantRules then checks and
+# makes moves on a game stored as a record of bytes (as used by packed_games.py) using only those tables, so every
+# variant gets the same fast path as standard ChessVar.
+#
+# Variant description keys:
+#   "name": a name for the variant
+#   "columns", "rows": the size of the board (columns are lettered from "a", rows numbered from 1)
+#   "pieces": a list of piece types, in the order used for square codes. Each has a "type" name, a "letter" (upper
+#       case in "setup" for WHITE, lower case for BLACK), and any of:
+#       "leaps": [change in column, change in row] offsets the piece jumps to
+#       "slides": [change in column, change in row] directions the piece slides along until blocked
+#       "pawn": {"WHITE": {...}, "BLACK": {...}}, each with "forward" (+1 or -1 rows), "double_step" (whether an unmoved
+#           pawn may move forward two squares), and "captures" (offsets that are only legal when capturing)
+#       A leap or capture offset may have a third number: the lowest column (0 for "a") the move may start from.
+#       Leaps and slides are the same for both players.
+#   "setup": the starting position, one string per row from the top row down, using piece letters and digits for runs
+#       of empty squares (as in FEN)
+#   "capture_targets" (optional): a dictionary of piece type to how many of that type a player must capture to win.
+#       Types left out are not a win condition. If this key is missing, capturing every piece of any one type wins.
+
+from ChessVar import PIECE_TYPES
+
+PLAYERS = ["WHITE", "BLACK"]
+GAME_STATES = ["UNFINISHED", "WHITE_WON", "BLACK_WON"]
+
+STRAIGHT_LINES = [[0, 1], [0, -1], [1, 0], [-1, 0]]
+DIAGONALS = [[1, 1], [-1, 1], [1, -1], [-1, -1]]
+
+# The standard ChessVar rules, including how the King and BLACK pawns only move toward the a-file from column c or
+# higher (as in King.move and Pawn.move).
+STANDARD_VARIANT = {
+    "name": "ChessVar",
+    "columns": 8,
+    "rows": 8,
+    "pieces": [
+        {"type": "Pawn", "letter": "P",
+         "pawn": {"WHITE": {"forward": 1, "double_step": True, "captures": [[-1, 1], [1, 1]]},
+                  "BLACK": {"forward": -1, "double_step": True, "captures": [[1, -1], [-1, -1, 2]]}}},
+        {"type": "Rook", "letter": "R", "slides": STRAIGHT_LINES},
+        {"type": "Knight", "letter": "N",
+         "leaps": [[-1, 2], [-1, -2], [1, 2], [1, -2], [-2, 1], [-2, -1], [2, 1], [2, -1]]},
+        {"type": "Bishop", "letter": "B", "slides": DIAGONALS},
+        {"type": "King", "letter": "K",
+         "leaps": [[0, 1], [0, -1], [1, 0], [1, 1], [1, -1], [-1, 0, 2], [-1, 1, 2], [-1, -1, 2]]},
+        {"type": "Queen", "letter": "Q", "slides": STRAIGHT_LINES + DIAGONALS},
+    ],
+    "setup": ["rnbqkbnr", "pppppppp", "8", "8", "8", "8", "PPPPPPPP", "RNBQKBNR"],
+}
+
+
+class VariantError(Exception):
+    """Raised when a variant description cannot be compiled."""
+    pass
+
+
+def _is_whole_number(value):
+    """Returns True if value is an int (and not a bool)."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _check_offsets(type_of_piece, name, offsets, lengths):
+    """
+    Raises VariantError unless offsets (the "leaps", "slides" or pawn "captures" of a piece type) is a list of lists
+    of whole numbers, each with one of the given lengths. A third number (the lowest column) may not be negative.
+    """
+    if not isinstance(offsets, (list, tuple)):
+        raise VariantError(name + " of " + str(type_of_piece) + " must be a list of offsets")
+    for offset in offsets:
+        if (not isinstance(offset, (list, tuple)) or len(offset) not in lengths
+                or not all(_is_whole_number(number) for number in offset)):
+            raise VariantError(name + " offset " + str(offset) + " of " + str(type_of_piece) + " must be "
+                               + " or ".join(str(length) for length in lengths) + " whole numbers")
+        if len(offset) > 2 and offset[2] < 0:
+            raise VariantError(name + " offset " + str(offset) + " of " + str(type_of_piece)
+                               + " has a negative lowest column")
+
+
+def _validate_description(description):
+    """
+    Checks the parts of a variant description that compiling relies on, raising VariantError for the first problem
+    found: a missing required key, a board size that is not a whole number, a "setup" that is not a list of strings,
+    a piece without a "type" or a one-character "letter", a repeated type or letter, a move offset that is not a list
+    of 2 (or, for leaps and captures, 3) whole numbers, a slide direction of [0, 0], a pawn without a "forward" of +1
+    or -1, or a "capture_targets" entry that is not a known piece type or not a count from 0 to 255.
+    """
+    for key in ["columns", "rows", "pieces", "setup"]:
+        if key not in description:
+            raise VariantError("variant description is missing '" + key + "'")
+    for key in ["columns", "rows"]:
+        if not _is_whole_number(description[key]):
+            raise VariantError("'" + key + "' must be a whole number")
+    if not isinstance(description["pieces"], (list, tuple)):
+        raise VariantError("'pieces' must be a list of piece types")
+    if not isinstance(description["setup"], (list, tuple)) or not all(isinstance(row_text, str)
+                                                                       for row_text in description["setup"]):
+        raise VariantError("'setup' must be a list of strings, one per row")
+
+    types_seen = set()
+    letters_seen = set()
+    for piece in description["pieces"]:
+        if not isinstance(piece, dict) or "type" not in piece or "letter" not in piece:
+            raise VariantError("every piece needs a 'type' and a 'letter'")
+        letter = piece["letter"]
+        if not (isinstance(letter, str) and len(letter) == 1 and letter.isalpha()):
+            raise VariantError("piece letter for " + str(piece["type"]) + " must be a single letter")
+        if piece["type"] in types_seen:
+            raise VariantError("piece type " + str(piece["type"]) + " is listed twice")
+        if letter.upper() in letters_seen:
+            raise VariantError("piece letter " + letter.upper() + " is used by more than one piece type")
+        types_seen.add(piece["type"])
+        letters_seen.add(letter.upper())
+
+        _check_offsets(piece["type"], "leaps", piece.get("leaps", []), (2, 3))
+        _check_offsets(piece["type"], "slides", piece.get("slides", []), (2,))
+        if [0, 0] in [list(direction) for direction in piece.get("slides", [])]:
+            raise VariantError("slides of " + str(piece["type"]) + " cannot include the direction [0, 0]")
+        pawn = piece.get("pawn")
+        if pawn is not None:
+            if not isinstance(pawn, dict):
+                raise VariantError("pawn of " + str(piece["type"]) + " must map players to pawn moves")
+            for player, pawn_moves in pawn.items():
+                if player not in PLAYERS or not isinstance(pawn_moves, dict):
+                    raise VariantError("pawn of " + str(piece["type"]) + " must map 'WHITE' and 'BLACK' to pawn moves")
+                forward = pawn_moves.get("forward")
+                if not _is_whole_number(forward) or forward not in (1, -1):
+                    raise VariantError("pawn 'forward' of " + str(piece["type"]) + " for " + player
+                                       + " must be 1 or -1")
+                _check_offsets(piece["type"], "captures", pawn_moves.get("captures", []), (2, 3))
+
+    targets = description.get("capture_targets")
+    if targets is not None:
+        for type_of_piece, count in targets.items():
+            if type_of_piece not in types_seen:
+                raise VariantError("capture target " + str(type_of_piece) + " is not a piece type")
+            if not (isinstance(count, int) and 0 <= count <= 255):
+                raise VariantError("capture target for " + str(type_of_piece) + " must be a count from 0 to 255")
+
+
+def _parse_setup(description, letters):
+    """
+    Returns a list of square codes (row 1 first) for the "setup" rows of a variant description. letters maps each
+    piece letter (upper case) to its type index.
+    """
+    columns = description["columns"]
+    number_of_types = len(description["pieces"])
+    if len(description["setup"]) != description["rows"]:
+        raise VariantError("setup must have one string per row")
+
+    square_codes = []
+    for row_text in reversed(description["setup"]):     # the setup lists the top row first
+        row_codes = []
+        empty_run = ""
+        for character in row_text + " ":
+            if character.isdigit():
+                empty_run += character
+                continue
+            if empty_run:
+                row_codes += [0] * int(empty_run)
+                empty_run = ""
+            if character == " ":
+                break
+            if character.upper() not in letters:
+                raise VariantError("unknown piece letter " + character)
+            code = letters[character.upper()] + 1
+            if character.islower():
+                code += number_of_types
+            row_codes.append(code)
+        if len(row_codes) != columns:
+            raise VariantError("setup row " + row_text + " does not have " + str(columns) + " squares")
+        square_codes += row_codes
+    return square_codes
+
+
+def _column_name(column):
+    """Returns the letter for a column number (0 is "a")."""
+    return "abcdefghijklmnopqrstuvwxyz"[column]
+
+
+def compile_variant(description):
+    """
+    Compiles a variant description (see the top of this file) into a VariantRules object.
+
+    Raises VariantError if the description is not valid.
+    """
+    return VariantRules(description)
+
+
+class VariantRules:
+    """
+    The compiled rules of a variant: precomputed move tables, the record layout of a game, and the starting record.
+
+    A game's record is a bytes-like sequence laid out as:
+    -one square code per square, row 1 first (0 is empty, 1 to T for WHITE's piece types and T + 1 to 2T for BLACK's,
+    where T is the number of piece types)
+    -whose turn it is (0 for "WHITE", 1 for "BLACK")
+    -the game state (0 for 'UNFINISHED', 1 for 'WHITE_WON', 2 for 'BLACK_WON')
+    -one bit per square, set while the pawn that started on that square has not moved
+    -T counters of how many of each type WHITE has left to capture, then T for BLACK
+    """
+
+    def __init__(self, description):
+        """Compiles the given variant description. Raises VariantError if it is not valid."""
+        _validate_description(description)
+        columns = description["columns"]
+        rows = description["rows"]
+        if not (1 <= columns <= 26 and 1 <= rows <= 99):
+            raise VariantError("the board must have 1-26 columns and 1-99 rows")
+        pieces = description["pieces"]
+        number_of_types = len(pieces)
+        if not (1 <= number_of_types <= 127):
+            raise VariantError("a variant needs 1-127 piece types")
+
+        self._name = description.get("name", "variant")
+        self._columns = columns
+        self._rows = rows
+        self._number_of_squares = columns * rows
+        self._piece_types = [piece["type"] for piece in pieces]
+        self._number_of_types = number_of_types
+        letters = {piece["letter"].upper(): type_index for type_index, piece in enumerate(pieces)}
+
+        self._square_names = [_column_name(index % columns) + str(index // columns + 1)
+                              for index in range(self._number_of_squares)]
+        self._square_indexes = {name: index for index, name in enumerate(self._square_names)}
+
+        # Record layout
+        self._turn_offset = self._number_of_squares
+        self._state_offset = self._turn_offset + 1
+        self._unmoved_offset = self._state_offset + 1
+        self._counter_offset = self._unmoved_offset + (self._number_of_squares + 7) // 8
+        self._record_size = self._counter_offset + 2 * number_of_types
+
+        # What each square code means: the owning player (0 or 1) and the type index
+        self._code_owner = [None] + [0] * number_of_types + [1] * number_of_types
+        self._code_type = [None] + list(range(number_of_types)) * 2
+
+        # Move tables, indexed [player][type index][from square]
+        self._leap_targets = [[], []]
+        self._slide_paths = [[], []]
+        self._pawn_pushes = [[], []]
+        self._pawn_captures = [[], []]
+        for player_index, player in enumerate(PLAYERS):
+            for piece in pieces:
+                self._leap_targets[player_index].append(self._build_leaps(piece.get("leaps", [])))
+                self._slide_paths[player_index].append(self._build_slides(piece.get("slides", [])))
+                pawn = piece.get("pawn", {}).get(player)
+                self._pawn_pushes[player_index].append(self._build_pushes(pawn))
+                if pawn is None:
+                    self._pawn_captures[player_index].append(self._build_leaps([]))
+                else:
+                    self._pawn_captures[player_index].append(self._build_leaps(pawn.get("captures", [])))
+        self._is_pawn = ["pawn" in piece for piece in pieces]
+
+        # Starting record
+        start_codes = _parse_setup(description, letters)
+        record = bytearray(self._record_size)
+        record[0:self._number_of_squares] = bytes(start_codes)
+        for index, code in enumerate(start_codes):
+            if code != 0 and self._is_pawn[self._code_type[code]]:
+                record[self._unmoved_offset + index // 8] |= 1 << index % 8
+
+        # The pieces each player has left to capture start at the number the opponent has (or the target number).
+        targets = description.get("capture_targets")
+        self._is_win_type = [False] * number_of_types
+        for type_index, type_of_piece in enumerate(self._piece_types):
+            for player_index in range(2):
+                opponent_code = type_index + 1 + (1 - player_index) * number_of_types
+                if targets is None:
+                    count = start_codes.count(opponent_code)
+                else:
+                    count = targets.get(type_of_piece, 0)
+                if count > 255:
+                    raise VariantError("capture targets must be at most 255")
+                record[self._counter_offset + player_index * number_of_types + type_index] = count
+                if count > 0:
+                    self._is_win_type[type_index] = True
+        if not any(self._is_win_type):
+            raise VariantError("the variant has no win condition: no piece type has a capture target above 0")
+        self._start_record = bytes(record)
+
+    def _build_leaps(self, offsets):
+        """Returns, for each square, the set of squares reached by the given leap offsets."""
+        targets = []
+        for index in range(self._number_of_squares):
+            column, row = index % self._columns, index // self._columns
+            reachable = set()
+            for offset in offsets:
+                lowest_column = offset[2] if len(offset) > 2 else 0
+                to_column, to_row = column + offset[0], row + offset[1]
+                if column >= lowest_column and 0 <= to_column < self._columns and 0 <= to_row < self._rows:
+                    reachable.add(to_row * self._columns + to_column)
+            targets.append(reachable)
+        return targets
+
+    def _build_slides(self, directions):
+        """
+        Returns, for each square, a dictionary of every square reachable by sliding in the given directions, to the
+        tuple of squares in between (which must be empty for the move to be legal).
+        """
+        paths = []
+        for index in range(self._number_of_squares):
+            reachable = {}
+            for change_in_column, change_in_row in directions:
+                column, row = index % self._columns, index // self._columns
+                between = []
+                while True:
+                    column += change_in_column
+                    row += change_in_row
+                    if not (0 <= column < self._columns and 0 <= row < self._rows):
+                        break
+                    to_index = row * self._columns + column
+                    reachable[to_index] = tuple(between)
+                    between.append(to_index)
+            paths.append(reachable)
+        return paths
+
+    def _build_pushes(self, pawn):
+        """
+        Returns, for each square, (one step forward or None, two steps forward or None) for a pawn described by pawn
+        (None if the piece type is not a pawn for this player).
+        """
+        pushes = []
+        for index in range(self._number_of_squares):
+            one_step = None
+            two_steps = None
+            if pawn is not None:
+                row = index // self._columns
+                forward = pawn["forward"]
+                if 0 <= row + forward < self._rows:
+                    one_step = index + forward * self._columns
+                    if pawn.get("double_step", False) and 0 <= row + 2 * forward < self._rows:
+                        two_steps = index + 2 * forward * self._columns
+            pushes.append((one_step, two_steps))
+        return pushes
+
+    def get_name(self):
+        """Returns the variant's name."""
+        return self._name
+
+    def get_piece_types(self):
+        """Returns the list of piece type names, in square code order."""
+        return list(self._piece_types)
+
+    def get_board_size(self):
+        """Returns (number of columns, number of rows) of the board."""
+        return self._columns, self._rows
+
+    def get_number_of_squares(self):
+        """Returns the number of squares on the board."""
+        return self._number_of_squares
+
+    def get_record_size(self):
+        """Returns the number of bytes in one game's record."""
+        return self._record_size
+
+    def get_record_offsets(self):
+        """
+        Returns a dictionary of where each part of a record starts, in bytes from the start of the record: the square
+        codes ("squares", one byte per square), whose turn it is ("turn", 0 for WHITE), the game state ("state", an
+        index into GAME_STATES), the pawn first-move bits ("unmoved") and the capture counters ("counters": WHITE's
+        counter for each piece type, then BLACK's).
+        """
+        return {"squares": 0, "turn": self._turn_offset, "state": self._state_offset,
+                "unmoved": self._unmoved_offset, "counters": self._counter_offset}
+
+    def get_start_record(self):
+        """Returns the bytes of the record for a new game."""
+        return self._start_record
+
+    def get_square_index(self, square):
+        """Returns the index of a square in algebraic notation, or None if it is not on the board."""
+        return self._square_indexes.get(square)
+
+    def get_square_name(self, index):
+        """Returns the square in algebraic notation for a square index."""
+        return self._square_names[index]
+
+    def get_game_state(self, data, base):
+        """Returns 'UNFINISHED', 'WHITE_WON', or 'BLACK_WON' for the record starting at data[base]."""
+        return GAME_STATES[data[base + self._state_offset]]
+
+    def get_whose_turn_it_is(self, data, base):
+        """Returns whose turn it is ('WHITE' or 'BLACK') for the record starting at data[base]."""
+        return PLAYERS[data[base + self._turn_offset]]
+
+    def get_pieces_left_to_capture(self, data, base, player):
+        """
+        Returns a dictionary of how many pieces of each type that is a win condition the given player ("WHITE" or
+        "BLACK") still has to capture, for the record starting at data[base].
+        """
+        counters = base + self._counter_offset
+        if player == "BLACK":
+            counters += self._number_of_types
+        pieces_left = {}
+        for type_index, type_of_piece in enumerate(self._piece_types):
+            if self._is_win_type[type_index]:
+                pieces_left[type_of_piece] = data[counters + type_index]
+        return pieces_left
+
+    def is_legal_move(self, data, base, from_index, to_index):
+        """
+        Returns True if moving the piece on from_index to to_index is legal for the player whose turn it is in the
+        record starting at data[base], otherwise False. The game must be unfinished (this is not checked here).
+        """
+        moving_code = data[base + from_index]
+        if moving_code == 0:
+            return False
+        player_index = self._code_owner[moving_code]
+        if player_index != data[base + self._turn_offset]:
+            return False    # the piece does not belong to the player whose turn it is
+
+        target_code = data[base + to_index]
+        if target_code != 0 and self._code_owner[target_code] == player_index:
+            return False    # a player cannot capture their own piece
+
+        type_index = self._code_type[moving_code]
+        if to_index in self._leap_targets[player_index][type_index][from_index]:
+            return True
+
+        between = self._slide_paths[player_index][type_index][from_index].get(to_index)
+        if between is not None:
+            for index in between:
+                if data[base + index] != 0:
+                    break   # the path is blocked in this direction
+            else:
+                return True
+
+        if target_code != 0:
+            return to_index in self._pawn_captures[player_index][type_index][from_index]
+
+        one_step, two_steps = self._pawn_pushes[player_index][type_index][from_index]
+        if to_index == one_step:
+            return True
+        if to_index == two_steps and data[base + one_step] == 0:
+            return bool(data[base + self._unmoved_offset + from_index // 8] & (1 << from_index % 8))
+        return False
+
+    def make_move(self, data, base, from_square, to_square):
+        """
+        Attempts a move in the record starting at data[base] (a bytearray), following the same steps as ChessVar's
+        make_move: the move must be legal and the game unfinished; the piece moves (capturing any opponent's piece on
+        to_square), the capturing player's counter for the captured type goes down (winning the game at 0), and the
+        turn passes to the other player.
+
+        Returns True if the move was made, otherwise False.
+        """
+        if data[base + self._state_offset] != 0:
+            return False
+        from_index = self._square_indexes.get(from_square)
+        to_index = self._square_indexes.get(to_square)
+        if from_index is None or to_index is None:
+            return False
+        if not self.is_legal_move(data, base, from_index, to_index):
+            return False
+
+        moving_code = data[base + from_index]
+        captured_code = data[base + to_index]
+        data[base + to_index] = moving_code
+        data[base + from_index] = 0
+
+        # A pawn leaving (or captured on) its starting square no longer has its first move.
+        for index in [from_index, to_index]:
+            data[base + self._unmoved_offset + index // 8] &= ~(1 << index % 8) & 0xFF
+
+        player_index = data[base + self._turn_offset]
+        if captured_code != 0:
+            captured_type = self._code_type[captured_code]
+            if self._is_win_type[captured_type]:
+                counter = base + self._counter_offset + player_index * self._number_of_types + captured_type
+                if data[counter] > 0:
+                    data[counter] -= 1
+                    if data[counter] == 0:
+                        data[base + self._state_offset] = player_index + 1  # 1 is 'WHITE_WON', 2 is 'BLACK_WON'
+
+        data[base + self._turn_offset] = 1 - player_index
+        return True
+
+
+STANDARD_RULES = compile_variant(STANDARD_VARIANT)
+
+if STANDARD_RULES.get_piece_types() != PIECE_TYPES:
+    raise VariantError("STANDARD_VARIANT must list its pieces in PIECE_TYPES order")